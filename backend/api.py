@@ -1,14 +1,38 @@
-from fastapi import FastAPI, Request, Query
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Request, Query, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from contextlib import asynccontextmanager
+import asyncio
+import io
 import json
 import os
-from scheduler_faker import StrictScheduler
+from typing import Optional
 import optimized_scheduler
-from fastapi.middleware.cors import CORSMiddleware
+import jobs
+import solution_cache
+import payload_codec
+import telemetry
+
+
+job_queue = None
+reoptimize_warm_up = None
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    global job_queue, reoptimize_warm_up
+    job_queue = jobs.JobQueue(cache=solution_cache.SolutionCache())
+    # Solver workers warm up in the background; /ready reports when they are done
+    job_queue.warm_up()
+    if job_queue.prewarm:
+        # /reoptimize-schedule/ solves in this process, so it is warmed here as well
+        reoptimize_warm_up = asyncio.create_task(asyncio.to_thread(optimized_scheduler.warm_up))
+    yield
+    job_queue.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,9 +41,247 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+
+def _submit(payload, decompose=None, trace=None, time_limit=None, gap=None, stream=False):
+    if decompose is not None and decompose not in optimized_scheduler.DECOMPOSE_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"decompose must be one of {list(optimized_scheduler.DECOMPOSE_MODES)}",
+        )
+    if stream and decompose is not None:
+        raise HTTPException(status_code=400, detail="stream=true applies to undecomposed solves only")
+    # Budgets are only passed when set so default requests share cache entries
+    options = {"decompose": decompose}
+    if time_limit is not None:
+        if time_limit <= 0:
+            raise HTTPException(status_code=400, detail="time_limit must be positive")
+        options["max_time_in_seconds"] = time_limit
+    if gap is not None:
+        if gap < 0:
+            raise HTTPException(status_code=400, detail="gap must not be negative")
+        options["relative_gap_limit"] = gap
+    try:
+        return job_queue.submit(payload, trace=trace, stream=stream, **options)
+    except jobs.QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+
+def _get_job(job_id):
+    try:
+        return job_queue.get(job_id)
+    except jobs.JobNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+
+
+def _result_with_trace(job, include_trace):
+    if not include_trace:
+        return job.result
+    return {**job.result, "trace": job.trace.to_dict()}
+
+
+async def _decode_schedule(request, request_trace):
+    # JSON or MessagePack (plain or columnar), optionally gzip/zstd compressed
+    body = await request.body()
+    try:
+        with request_trace.stage("json_decode"):
+            return payload_codec.decode_schedule(
+                body,
+                request.headers.get("content-type"),
+                request.headers.get("content-encoding"),
+            )
+    except payload_codec.UnsupportedPayloadError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except (ValueError, KeyError, IndexError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Malformed schedule payload: {e}")
+
+
+async def _wait_for(job):
+    await asyncio.wrap_future(job.future)
+    if job.status != jobs.DONE:
+        raise HTTPException(status_code=500, detail=job.error or f"Job {job.status}")
+
 
 @app.get("/optimize-schedule/")
-async def optimize_schedule(data: str = Query(...)):
-    input_json = json.loads(data)
-    result = optimized_scheduler.optimize_caretaker_schedule(input_json)
+async def optimize_schedule(
+    data: str = Query(...),
+    decompose: Optional[str] = None,
+    trace: bool = False,
+    time_limit: Optional[float] = None,
+    gap: Optional[float] = None,
+):
+    request_trace = telemetry.Trace()
+    try:
+        with request_trace.stage("json_decode"):
+            input_json = payload_codec.validate_schedule(json.loads(data))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Malformed schedule payload: {e}")
+    # Solve in the worker pool so a long solve does not block the event loop
+    job = _submit(input_json, decompose, request_trace, time_limit, gap)
+    await _wait_for(job)
+    return JSONResponse(content=_result_with_trace(job, trace))
+
+
+@app.post("/optimize-schedule/")
+async def optimize_schedule_post(
+    request: Request,
+    decompose: Optional[str] = None,
+    trace: bool = False,
+    time_limit: Optional[float] = None,
+    gap: Optional[float] = None,
+):
+    # Answers in the format named by the Accept header
+    request_trace = telemetry.Trace()
+    input_json = await _decode_schedule(request, request_trace)
+    job = _submit(input_json, decompose, request_trace, time_limit, gap)
+    await _wait_for(job)
+    body, media_type = payload_codec.encode_result(_result_with_trace(job, trace), request.headers.get("accept"))
+    return Response(content=body, media_type=media_type)
+
+
+@app.post("/reoptimize-schedule/")
+async def reoptimize_schedule(request: Request, trace: bool = False):
+    try:
+        body = await request.json()
+        if not isinstance(body, dict) or "previous" not in body:
+            raise ValueError("Body must contain 'previous' and 'delta'")
+        previous = payload_codec.validate_schedule(body["previous"])
+        delta = optimized_scheduler.validate_delta(body.get("delta", {}))
+        payload_codec.validate_schedule({"caretakers": delta.get("add_caretakers", [])})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Malformed re-optimization request: {e}")
+    # Incremental solves are small and short, so they run on a thread instead of
+    # waiting behind full optimizations in the job queue; startup warms this process for them
+    request_trace = telemetry.Trace()
+    result = await asyncio.to_thread(
+        optimized_scheduler.reoptimize_caretaker_schedule, previous, delta, trace=request_trace
+    )
+    if trace:
+        result = {**result, "trace": request_trace.to_dict()}
     return JSONResponse(content=result)
+
+
+@app.post("/jobs/", status_code=202)
+async def submit_job(
+    request: Request,
+    decompose: Optional[str] = None,
+    time_limit: Optional[float] = None,
+    gap: Optional[float] = None,
+    stream: bool = False,
+):
+    request_trace = telemetry.Trace()
+    input_json = await _decode_schedule(request, request_trace)
+    job = _submit(input_json, decompose, request_trace, time_limit, gap, stream)
+    return job.to_dict()
+
+
+@app.get("/jobs/")
+async def queue_stats():
+    return job_queue.stats()
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    return _get_job(job_id).to_dict()
+
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str, trace: bool = False):
+    job = _get_job(job_id)
+    state = job.state
+    if state == jobs.DONE:
+        return JSONResponse(content={**job.to_dict(), "result": _result_with_trace(job, trace)})
+    if state in jobs.FINISHED_STATES:
+        return JSONResponse(status_code=409, content=job.to_dict())
+    return JSONResponse(status_code=202, content=job.to_dict())
+
+
+@app.get("/jobs/{job_id}/export")
+async def job_export(job_id: str, view: str = "caretakers"):
+    # The finished schedule as an Excel workbook, one sheet per caretaker or per patient
+    if view not in ("caretakers", "patients"):
+        raise HTTPException(status_code=400, detail="view must be 'caretakers' or 'patients'")
+    job = _get_job(job_id)
+    state = job.state
+    if state in jobs.FINISHED_STATES and state != jobs.DONE:
+        return JSONResponse(status_code=409, content=job.to_dict())
+    if state != jobs.DONE:
+        return JSONResponse(status_code=202, content=job.to_dict())
+    # openpyxl is only loaded once somebody asks for a workbook
+    import excel_export
+    buffer = await asyncio.to_thread(excel_export.export_schedule, job.result, io.BytesIO(), view)
+    return Response(
+        content=buffer.getvalue(),
+        media_type=excel_export.XLSX,
+        headers={"Content-Disposition": f'attachment; filename="{view}_schedule.xlsx"'},
+    )
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    job = _get_job(job_id)
+
+    async def stream():
+        last_state = None
+        last_solution = 0
+        while True:
+            state = job.state
+            if state != last_state:
+                last_state = state
+                yield f"event: status\ndata: {json.dumps(job.to_dict())}\n\n"
+            # Streaming jobs also report each improving solution with its objective and bound
+            if job.solutions != last_solution and state not in jobs.FINISHED_STATES:
+                last_solution = job.solutions
+                yield f"event: solution\ndata: {json.dumps(job.best)}\n\n"
+            if state in jobs.FINISHED_STATES:
+                if state == jobs.DONE:
+                    yield f"event: result\ndata: {json.dumps(job.result)}\n\n"
+                return
+            await asyncio.sleep(0.25)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+@app.post("/jobs/{job_id}/accept")
+async def accept_job(job_id: str):
+    _get_job(job_id)
+    try:
+        return job_queue.accept(job_id).to_dict()
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.get("/ready")
+async def ready():
+    # Readiness probe: 503 until every solver worker and the re-optimization path
+    # in this process have finished their warm-up solves
+    readiness = job_queue.readiness()
+    if reoptimize_warm_up is not None:
+        warm = reoptimize_warm_up.done() and reoptimize_warm_up.exception() is None
+        readiness["reoptimize_ready"] = warm
+        readiness["ready"] = readiness["ready"] and warm
+        if reoptimize_warm_up.done() and not warm:
+            error = reoptimize_warm_up.exception()
+            readiness.setdefault("error", f"{type(error).__name__}: {error}")
+    return JSONResponse(status_code=200 if readiness["ready"] else 503, content=readiness)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return job_queue.cache.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    stats = job_queue.stats()
+    return telemetry.REGISTRY.render({
+        "schedule_jobs": {f'{{status="{state}"}}': count for state, count in stats["jobs"].items()},
+        "schedule_job_workers": stats["max_workers"],
+    })
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    _get_job(job_id)
+    return job_queue.cancel(job_id).to_dict()
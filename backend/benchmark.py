@@ -0,0 +1,349 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+import urllib.error
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+
+import optimized_scheduler
+import telemetry
+from schedule_core import Schedule
+from scheduler_faker import StrictScheduler, enforce_consistent_caretakers_per_profession
+
+BUILD_SIZES = [(30, 80), (100, 300), (500, 2000)]
+TIERS = {
+    "tiny": (5, 15),
+    "small": (30, 80),
+    "medium": (100, 300),
+    "large": (500, 2000),
+    "xlarge": (2000, 10000),
+    "huge": (5000, 30000),
+}
+DEFAULT_TIERS = ["tiny", "small", "medium", "large"]
+MODES = ["monolithic"] + list(optimized_scheduler.DECOMPOSE_MODES)
+
+
+def generate_instance(num_caretakers, num_patients, seed=0):
+    scheduler = StrictScheduler(num_caretakers=num_caretakers, num_patients=num_patients, seed=seed)
+    scheduler.generate_caretakers()
+    scheduler.assign_patients()
+    enforce_consistent_caretakers_per_profession(scheduler)
+    return scheduler.caretaker_payload()
+
+
+def benchmark_build(num_caretakers, num_patients, seed=0):
+    caretaker_json = generate_instance(num_caretakers, num_patients, seed)['caretakers']
+
+    start = time.perf_counter()
+    _, pairs = optimized_scheduler._ingest(caretaker_json)
+    with contextlib.redirect_stdout(io.StringIO()):
+        model, _ = optimized_scheduler._build_model(
+            [(pairs, range(len(optimized_scheduler.DAYS)))], len(optimized_scheduler.HOURS)
+        )
+    build_seconds = time.perf_counter() - start
+    proto = model.Proto()
+    return {
+        "caretakers": num_caretakers,
+        "patients": num_patients,
+        "pairs": len(pairs),
+        "variables": len(proto.variables),
+        "constraints": len(proto.constraints),
+        "build_seconds": round(build_seconds, 4),
+    }
+
+
+def _peak_memory_mb():
+    # ru_maxrss is in kilobytes on Linux. RUSAGE_CHILDREN only covers children that
+    # have exited, so the subproblem pool is shut down first; the result is the
+    # peak of this process or of its largest subproblem process
+    optimized_scheduler.shutdown_subproblem_pool()
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / 1024
+
+
+def _count_slots(caretakers):
+    return sum(len(hour_map) for c in caretakers for hour_map in c['schedule'].values())
+
+
+def run_case(tier, mode, seed, max_time_in_seconds):
+    # Runs in a fresh process so peak memory belongs to this case only
+    num_caretakers, num_patients = TIERS[tier]
+    start = time.perf_counter()
+    payload = generate_instance(num_caretakers, num_patients, seed)
+    generate_seconds = time.perf_counter() - start
+
+    trace = telemetry.Trace()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = optimized_scheduler.optimize_caretaker_schedule(
+            payload,
+            decompose=None if mode == "monolithic" else mode,
+            trace=trace,
+            max_time_in_seconds=max_time_in_seconds,
+        )
+    total_seconds = time.perf_counter() - start
+
+    stages = trace.stages
+    solver = trace.solver
+    return {
+        "tier": tier,
+        "mode": mode,
+        "seed": seed,
+        "caretakers": num_caretakers,
+        "patients": num_patients,
+        "input_slots": _count_slots(payload['caretakers']),
+        "generate_seconds": generate_seconds,
+        "build_seconds": stages.get("create_variables", 0.0) + stages.get("add_constraints", 0.0),
+        "solve_seconds": stages.get("solve", 0.0),
+        "total_seconds": total_seconds,
+        "stages": stages,
+        "peak_memory_mb": _peak_memory_mb(),
+        "status": solver.get("status"),
+        "objective": solver.get("objective"),
+        "best_bound": solver.get("best_bound"),
+        "gap": solver.get("gap"),
+        "output_slots": _count_slots(result['caretakers']),
+    }
+
+
+def _traced_bytes(build):
+    tracemalloc.start()
+    try:
+        value = build()
+        return value, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def measure_memory(num_caretakers, num_patients, weeks, seed=0):
+    # A generated week repeated `weeks` times, held once as the nested
+    # {name: {day: {hour: patient}}} payload and once as a Schedule
+    week = generate_instance(num_caretakers, num_patients, seed)['caretakers']
+    days = [f"{day} {w + 1}" for w in range(weeks) for day in optimized_scheduler.DAYS]
+
+    def nested():
+        return [
+            {'name': c['name'], 'schedule': {
+                f"{day} {w + 1}": dict(hour_map) for w in range(weeks) for day, hour_map in c['schedule'].items()
+            }}
+            for c in week
+        ]
+
+    payload, nested_bytes = _traced_bytes(nested)
+    schedule, compact_bytes = _traced_bytes(lambda: Schedule.from_caretakers(payload, days))
+    return {
+        "caretakers": num_caretakers,
+        "patients": num_patients,
+        "weeks": weeks,
+        "slots": int((schedule.grid >= 0).sum()),
+        "nested_mb": nested_bytes / 2**20,
+        "compact_mb": compact_bytes / 2**20,
+    }
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _request(url, body=None, timeout=120):
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def measure_cold_start(tier, prewarm, seed=0, timeout=120):
+    # Starts the API in a fresh uvicorn process and times how long it takes to
+    # accept connections, to report ready and to answer a first optimization
+    payload = json.dumps(generate_instance(*TIERS[tier], seed)).encode()
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, SCHEDULER_WARM_UP="1" if prewarm else "0")
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--port", str(port)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        listening = ready = None
+        while ready is None:
+            if server.poll() is not None or time.perf_counter() - start > timeout:
+                raise RuntimeError("API did not become ready")
+            try:
+                status = _request(f"{base}/ready", timeout=1)
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+                continue
+            listening = listening or time.perf_counter() - start
+            if status == 200:
+                ready = time.perf_counter() - start
+            else:
+                time.sleep(0.01)
+        sent = time.perf_counter()
+        status = _request(f"{base}/optimize-schedule/", payload, timeout)
+        first_response = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+    return {
+        "tier": tier,
+        "prewarm": prewarm,
+        "status": status,
+        "listening_seconds": listening,
+        "ready_seconds": ready,
+        "first_request_seconds": first_response - (sent - start),
+        "first_response_seconds": first_response,
+    }
+
+
+def _environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import ortools
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "ortools": ortools.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r["tier"], r["mode"]): r for r in json.load(f)["results"]}
+    print(f"\nCompared with {baseline_path}:")
+    for r in results:
+        old = baseline.get((r["tier"], r["mode"]))
+        if old is None:
+            continue
+        ratios = ", ".join(
+            f"{key} x{r[key] / old[key]:.2f}"
+            for key in ("build_seconds", "solve_seconds", "total_seconds", "peak_memory_mb")
+            if old[key]
+        )
+        objective = (r["objective"] or 0) - (old["objective"] or 0)
+        print(f"  {r['tier']:>7} {r['mode']:>10}: {ratios}, objective {objective:+g}")
+
+
+def scale(args):
+    results = []
+    for tier in args.tiers:
+        for mode in args.modes:
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                result = pool.submit(run_case, tier, mode, args.seed, args.time_limit).result()
+            print(
+                f"{tier:>7} {mode:>10}: build {result['build_seconds']:.3f}s, "
+                f"solve {result['solve_seconds']:.3f}s, total {result['total_seconds']:.3f}s, "
+                f"peak {result['peak_memory_mb']:.0f} MB, {result['status']} "
+                f"objective {result['objective']} (gap {result['gap']:.4f})"
+            )
+            results.append(result)
+    _write_results(args.output, results)
+    if args.compare:
+        compare(results, args.compare)
+
+
+def build(args):
+    results = []
+    for num_caretakers, num_patients in BUILD_SIZES:
+        result = benchmark_build(num_caretakers, num_patients, args.seed)
+        print(
+            f"{num_caretakers:>5} caretakers / {num_patients:>5} patients: "
+            f"{result['pairs']} pairs, {result['variables']} variables, "
+            f"{result['constraints']} constraints, built in {result['build_seconds']:.3f}s"
+        )
+        results.append(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+def _write_results(path, results):
+    with open(path, "w") as f:
+        json.dump({"environment": _environment(), "results": results}, f, indent=2)
+    print(f"Results written to {path}")
+
+
+def memory(args):
+    results = []
+    for tier in args.tiers:
+        result = {"tier": tier, **measure_memory(*TIERS[tier], args.weeks, args.seed)}
+        print(
+            f"{tier:>7}: {result['slots']} slots over {args.weeks} weeks, nested dicts "
+            f"{result['nested_mb']:.1f} MB, compact schedule {result['compact_mb']:.1f} MB "
+            f"(x{result['nested_mb'] / result['compact_mb']:.1f})"
+        )
+        results.append(result)
+    _write_results(args.output, results)
+
+
+def cold_start(args):
+    results = []
+    for prewarm in (True, False):
+        result = measure_cold_start(args.tier, prewarm, args.seed)
+        print(
+            f"{'warm-up' if prewarm else 'no warm-up':>10}: listening {result['listening_seconds']:.2f}s, "
+            f"ready {result['ready_seconds']:.2f}s, first {args.tier} request "
+            f"{result['first_request_seconds']:.2f}s, first response {result['first_response_seconds']:.2f}s"
+        )
+        results.append(result)
+    _write_results(args.output, results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the schedule optimizer")
+    parser.add_argument("--seed", type=int, default=0)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = commands.add_parser("build", help="Time CP-SAT model construction only")
+    build_parser.add_argument("--output", help="Write results as JSON to this file")
+    build_parser.set_defaults(func=build)
+
+    scale_parser = commands.add_parser("scale", help="Generate, build and solve instances of growing size")
+    scale_parser.add_argument("--tiers", nargs="+", choices=list(TIERS), default=DEFAULT_TIERS)
+    scale_parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    scale_parser.add_argument("--time-limit", type=float, default=optimized_scheduler.MAX_TIME_IN_SECONDS)
+    scale_parser.add_argument("--output", default="benchmark_results.json")
+    scale_parser.add_argument("--compare", help="Earlier results file to report changes against")
+    scale_parser.set_defaults(func=scale)
+
+    memory_parser = commands.add_parser("memory", help="Compare nested dict and compact schedule memory")
+    memory_parser.add_argument("--tiers", nargs="+", choices=list(TIERS), default=["small", "medium", "large"])
+    memory_parser.add_argument("--weeks", type=int, default=52)
+    memory_parser.add_argument("--output", default="benchmark_memory.json")
+    memory_parser.set_defaults(func=memory)
+
+    cold_parser = commands.add_parser("coldstart", help="Time API start-up to ready and to a first response")
+    cold_parser.add_argument("--tier", choices=list(TIERS), default="small")
+    cold_parser.add_argument("--output", default="benchmark_coldstart.json")
+    cold_parser.set_defaults(func=cold_start)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
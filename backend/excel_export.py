@@ -0,0 +1,46 @@
+from openpyxl import Workbook
+
+from schedule_core import DAYS, HOURS, Schedule
+
+XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+MAX_TITLE_LENGTH = 31
+
+
+def write_workbook(target, grids, days=DAYS, hours=HOURS):
+    # Write-only workbooks stream rows to disk instead of keeping every cell object
+    # in memory; `target` is a path or a binary file object
+    wb = Workbook(write_only=True)
+    header = ["Hour", *days]
+    for title, grid in grids:
+        ws = wb.create_sheet(title=str(title)[:MAX_TITLE_LENGTH])
+        ws.append(header)
+        for hour, row in zip(hours, grid.tolist()):
+            ws.append([hour, *row])
+    wb.save(target)
+    return target
+
+
+def caretaker_grids(schedule, labels=None):
+    # One (hour, day) grid per caretaker. `labels` maps patient ids to cell text
+    # and ends with the value for empty slots (see NameTable.labels); the lookup
+    # is a single vectorized take over the whole occupancy grid
+    labels = schedule.patients.labels() if labels is None else labels
+    return list(zip(schedule.caretakers.names, labels[schedule.grid].transpose(0, 2, 1)))
+
+
+def patient_grids(schedule, labels=None):
+    labels = schedule.caretakers.labels() if labels is None else labels
+    cells = labels[schedule.patient_view().grid()].transpose(0, 2, 1)
+    return list(zip(schedule.patients.names, cells))
+
+
+def export_schedule(result, target, view="caretakers"):
+    """Write an optimizer result as a workbook with one sheet per caretaker or per patient."""
+    schedule = Schedule.from_caretakers(result['caretakers'])
+    if view == "caretakers":
+        grids = caretaker_grids(schedule)
+    elif view == "patients":
+        grids = sorted(patient_grids(schedule), key=lambda sheet: sheet[0])
+    else:
+        raise ValueError(f"view must be 'caretakers' or 'patients', not {view!r}")
+    return write_workbook(target, grids, schedule.days, schedule.hours)
@@ -0,0 +1,338 @@
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import optimized_scheduler
+import solution_cache
+import telemetry
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+WARM_UP_TIMEOUT_IN_SECONDS = 60
+DEFAULT_SOLVER_CPUS = 4
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class JobNotFoundError(KeyError):
+    pass
+
+
+def _run_optimization(payload, options, job_id=None, progress=None, stop=None):
+    # Runs inside a worker process; timestamps are taken here so queue wait and
+    # solve time can be told apart. Every job ends early once `stop` is set;
+    # streaming jobs also report improving solutions on the shared `progress` queue.
+    started_at = time.time()
+    trace = telemetry.Trace()
+    if progress is not None:
+        options = dict(options, on_solution=lambda update: progress.put((job_id, update)))
+    if stop is not None:
+        options = dict(options, should_stop=stop.is_set)
+    result = optimized_scheduler.optimize_caretaker_schedule(payload, trace=trace, **options)
+    return result, started_at, time.time(), trace.to_dict()
+
+
+def _warm_worker(barrier):
+    # Pool initializer. The barrier holds every worker until all of them are warm,
+    # so any finished readiness task means the whole pool is
+    optimized_scheduler.warm_up()
+    try:
+        barrier.wait(WARM_UP_TIMEOUT_IN_SECONDS)
+    except threading.BrokenBarrierError:
+        pass
+
+
+def _worker_ready():
+    return os.getpid()
+
+
+class Job:
+    def __init__(self, job_id, future, cache_key=None, trace=None):
+        self.job_id = job_id
+        self.future = future
+        self.cache_key = cache_key
+        self.trace = trace or telemetry.Trace()
+        self.cached = False
+        self.stream = False
+        self.stop_event = None
+        self.accepted = False
+        self.solutions = 0
+        self.best = None
+        self.status = PENDING
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def state(self):
+        if self.status == PENDING and self.future.running():
+            return RUNNING
+        return self.status
+
+    def timing(self):
+        timing = {
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "queue_seconds": None,
+            "run_seconds": None,
+            "total_seconds": None,
+        }
+        if self.started_at is not None:
+            timing["queue_seconds"] = self.started_at - self.submitted_at
+        if self.finished_at is not None:
+            if self.started_at is not None:
+                timing["run_seconds"] = self.finished_at - self.started_at
+            timing["total_seconds"] = self.finished_at - self.submitted_at
+        return timing
+
+    def to_dict(self):
+        data = {"job_id": self.job_id, "status": self.state, "cached": self.cached, "timing": self.timing()}
+        if self.stream:
+            data["solutions"] = self.solutions
+            data["accepted"] = self.accepted
+            if self.best is not None:
+                data["best"] = {key: value for key, value in self.best.items() if key != "result"}
+        if self.error is not None:
+            data["error"] = self.error
+        return data
+
+
+class JobQueue:
+    def __init__(self, max_workers=None, max_queue_depth=None, max_finished_jobs=256, cache=None, prewarm=None,
+                 solver_cpus=None):
+        cpus = os.cpu_count() or 1
+        max_workers = max_workers or int(os.environ.get("SCHEDULER_MAX_WORKERS", 0))
+        # CPU budget of one job: the CP-SAT threads of a monolithic solve, or the
+        # subproblem processes times their threads of a decomposed one. Unless the
+        # pool size is given, it runs as many jobs as fit the cores at that budget,
+        # so a full pool never runs more solver threads than there are cores
+        self.solver_cpus = solver_cpus or int(os.environ.get("SCHEDULER_SOLVER_CPUS", 0)) or max(
+            1, cpus // max_workers if max_workers else min(cpus, DEFAULT_SOLVER_CPUS)
+        )
+        self.max_workers = max_workers or max(1, cpus // self.solver_cpus)
+        self.max_queue_depth = max_queue_depth or int(
+            os.environ.get("SCHEDULER_MAX_QUEUE_DEPTH", 0)
+        ) or 4 * self.max_workers
+        self.max_finished_jobs = max_finished_jobs
+        self.cache = cache
+        self.prewarm = prewarm if prewarm is not None else os.environ.get("SCHEDULER_WARM_UP", "1") != "0"
+        if self.prewarm:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_warm_worker,
+                initargs=(multiprocessing.Barrier(self.max_workers),),
+            )
+        else:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        self._warm_futures = []
+        self._warm_up_started_at = None
+        self._warm_up_seconds = None
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        # Started with the first job; plain queues and events cannot be passed to
+        # pool workers, manager proxies can
+        self._manager = None
+        self._progress = None
+
+    def warm_up(self):
+        # Starts every worker now instead of on the first job; without fork,
+        # workers are only spawned when no idle one is left, hence one task each
+        if not self.prewarm or self._warm_futures:
+            return
+        self._warm_up_started_at = time.time()
+        self._warm_futures = [self._executor.submit(_worker_ready) for _ in range(self.max_workers)]
+        for future in self._warm_futures:
+            future.add_done_callback(self._on_warm)
+
+    def readiness(self):
+        warm = [f for f in self._warm_futures if f.done() and f.exception() is None]
+        failed = [f for f in self._warm_futures if f.done() and f.exception() is not None]
+        ready = not self.prewarm or (len(warm) == self.max_workers)
+        readiness = {
+            "ready": ready,
+            "prewarm": self.prewarm,
+            "workers": self.max_workers,
+            "warm_workers": len(warm) if self.prewarm else self.max_workers,
+            "warm_up_seconds": self._warm_up_seconds,
+        }
+        if failed:
+            error = failed[0].exception()
+            readiness["error"] = f"{type(error).__name__}: {error}"
+        return readiness
+
+    def submit(self, payload, trace=None, stream=False, **options):
+        cache_key = None
+        if self.cache is not None:
+            cache_key = solution_cache.canonical_key(payload.get('caretakers', []), **options)
+            solution = self.cache.get(cache_key)
+            if solution is not None:
+                return self._finished_job(solution_cache.apply_solution(solution, payload['caretakers']), trace)
+        with self._lock:
+            active = self._active()
+            if active >= self.max_queue_depth:
+                raise QueueFullError(f"Job queue is full ({active}/{self.max_queue_depth} jobs)")
+            job_id = uuid.uuid4().hex
+            self._start_manager()
+            stop = self._manager.Event()
+            progress = self._progress if stream else None
+            run_options = {"max_workers": self.solver_cpus, **options}
+            future = self._executor.submit(_run_optimization, payload, run_options, job_id, progress, stop)
+            job = Job(job_id, future, cache_key, trace)
+            job.stream = stream
+            job.stop_event = stop
+            self._jobs[job_id] = job
+            self._evict_finished()
+        future.add_done_callback(lambda f, job=job: self._on_done(job, f))
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise JobNotFoundError(job_id)
+        return job
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        with self._lock:
+            if job.status in FINISHED_STATES:
+                return job
+            job.status = CANCELLED
+            job.finished_at = time.time()
+        # Pending jobs never reach a worker; a running solve is told to stop and its
+        # result is discarded. Until its worker is free the job still counts
+        # against the queue depth. cancel() runs the done callback, which takes
+        # the lock, so it is called outside of it.
+        job.future.cancel()
+        if job.stop_event is not None:
+            job.stop_event.set()
+        return job
+
+    def accept(self, job_id):
+        # Ends a streaming solve early; the job finishes with its best solution so far
+        job = self.get(job_id)
+        if not job.stream:
+            raise ValueError(f"Job {job_id} was not submitted with stream=True")
+        with self._lock:
+            if job.status in FINISHED_STATES:
+                return job
+            job.accepted = True
+        job.stop_event.set()
+        return job
+
+    def stats(self):
+        with self._lock:
+            counts = {state: 0 for state in (PENDING, RUNNING, DONE, FAILED, CANCELLED)}
+            for job in self._jobs.values():
+                counts[job.state] += 1
+        return {
+            "max_workers": self.max_workers,
+            "solver_cpus": self.solver_cpus,
+            "max_queue_depth": self.max_queue_depth,
+            "jobs": counts,
+        }
+
+    def shutdown(self):
+        # Running solves are stopped and awaited first: workers still hold
+        # proxies to the manager, so it has to outlive them
+        with self._lock:
+            running = [job for job in self._jobs.values() if not job.future.done()]
+        for job in running:
+            job.stop_event.set()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        if self._manager is not None:
+            self._progress.put(None)
+            self._manager.shutdown()
+
+    def _start_manager(self):
+        if self._manager is None:
+            self._manager = multiprocessing.Manager()
+            self._progress = self._manager.Queue()
+            threading.Thread(target=self._drain_progress, daemon=True).start()
+
+    def _active(self):
+        # Cancelled jobs whose solve is still winding down keep their worker busy
+        return sum(
+            1 for job in self._jobs.values()
+            if job.status not in FINISHED_STATES or not job.future.done()
+        )
+
+    def _drain_progress(self):
+        progress = self._progress
+        while True:
+            try:
+                item = progress.get()
+            except (EOFError, OSError):
+                return
+            if item is None:
+                return
+            job_id, update = item
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is not None and job.status not in FINISHED_STATES:
+                    job.solutions += 1
+                    job.best = update
+
+    def _on_warm(self, future):
+        if all(f.done() for f in self._warm_futures):
+            self._warm_up_seconds = time.time() - self._warm_up_started_at
+
+    def _on_done(self, job, future):
+        with self._lock:
+            if job.status == CANCELLED:
+                pass
+            elif future.cancelled():
+                job.status = CANCELLED
+                job.finished_at = time.time()
+            elif future.exception() is not None:
+                error = future.exception()
+                job.status = FAILED
+                job.error = f"{type(error).__name__}: {error}"
+                job.finished_at = time.time()
+            else:
+                job.result, job.started_at, job.finished_at, trace = future.result()
+                job.trace.merge(trace)
+                job.status = DONE
+                if job.accepted and job.trace.solver.get("status") not in telemetry.SOLVED_STATUSES:
+                    # Accepted before the first solution: the result is just the input
+                    job.status = FAILED
+                    job.result = None
+                    job.error = "Accepted before any solution was found"
+        telemetry.REGISTRY.observe(job.trace.to_dict(), job.status)
+        # A solve accepted early is not the best answer for its settings, and one that
+        # found no solution returned its input unchanged, so neither is cached
+        solved = job.trace.solver.get("status") in telemetry.SOLVED_STATUSES
+        if job.status == DONE and solved and not job.accepted and self.cache is not None and job.cache_key is not None:
+            self.cache.put(job.cache_key, solution_cache.solution_of(job.result))
+
+    def _finished_job(self, result, trace=None):
+        future = Future()
+        future.set_result(None)
+        job = Job(uuid.uuid4().hex, future, trace=trace)
+        job.cached = True
+        job.result = result
+        job.status = DONE
+        job.started_at = job.finished_at = job.submitted_at
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._evict_finished()
+        telemetry.REGISTRY.observe(job.trace.to_dict(), job.status, cached=True)
+        return job
+
+    def _evict_finished(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED_STATES]
+        for job_id in finished[: max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
@@ -1,89 +1,306 @@
-import pandas as pd
-from ortools.sat.python import cp_model
+import multiprocessing
+import multiprocessing.util
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import json
+import telemetry
+from schedule_core import DAYS, HOURS, Schedule
+# OR-Tools is imported inside the functions that build or solve models: it is a
+# large import that the API process only needs for /reoptimize-schedule/ and
+# solver workers pay once in warm_up
 
-def caretaker_json_to_df(caretaker_json):
-    data = []
-    # caretaker_json is a list of dicts with 'name' and 'schedule'
+MAX_TIME_IN_SECONDS = 60  # Add timeout to prevent long solving times
+REOPTIMIZE_TIME_IN_SECONDS = 5
+STREAM_INTERVAL_IN_SECONDS = 0.25
+# Every hard constraint is scoped to one day, so the problem splits per day or,
+# more finely, per connected component of the caretaker-patient graph and day
+DECOMPOSE_MODES = ("day", "component")
+
+def _schedule_slots(caretaker_json):
+    # (caretaker, patient, day, hour) for every filled slot of a caretaker list;
+    # like Schedule.from_caretakers, slots outside DAYS x HOURS are skipped
     for caretaker in caretaker_json:
         name = caretaker.get('name')
-        schedule = caretaker.get('schedule', {})
-        for day, hour_map in schedule.items():
+        for day, hour_map in caretaker.get('schedule', {}).items():
+            if day not in DAYS:
+                continue
             for hour, patient in hour_map.items():
-                data.append({"Caretaker": name, "Day": day, "Hour": int(hour), "Patient": patient})
-    return pd.DataFrame(data)
-
-def _create_variables(model, caretakers, patients, assignments, days, hours):
-    x = {}
-    for c in caretakers:
-        for p in patients:
-            if (c, p) in assignments:
-                for d in days:
-                    for h in hours:
-                        x[c, p, d, h] = model.NewBoolVar(f"x_{c}_{p}_{d}_{h}")
-    return x    
-
-def _add_constraints(model, x, caretakers, patients, assignments, days, hours):
-    constraint_count = 0
-    
-    # 1. Caretaker Minimum Working Time: Each caretaker should work at least 3 hours per day (reduced from 5)
-    for c in caretakers:
-        for d in days:
-            # Make this a soft constraint by using maximize objective instead
-            assigned_hours = sum(x[c, p, d, h] for p in patients for h in hours if (c, p, d, h) in x)
-            model.Maximize(assigned_hours)
-            constraint_count += 1
+                if int(hour) in HOURS:
+                    yield name, patient, day, int(hour)
 
-    # 2. Patient Minimum Treatments: Each patient should receive at least 2 treatments per day (reduced from 3)
-    for p in patients:
-        for d in days:
-            # Make this a soft constraint by using maximize objective instead
-            treatments = sum(x[c, p, d, h] for c in caretakers for h in hours if (c, p, d, h) in x)
-            model.Maximize(treatments)
-            constraint_count += 1
+def _ingest(caretaker_json):
+    # The compact schedule (interned names, occupancy grid) plus the sorted array
+    # of (caretaker, patient) index pairs that need variables
+    schedule = Schedule.from_caretakers(caretaker_json)
+    return schedule, schedule.pairs()
+
+def _group_rows(keys):
+    # Row numbers of `keys` grouped by key value, e.g. the pairs of every patient
+    order = np.argsort(keys, kind="stable")
+    breaks = np.flatnonzero(np.diff(keys[order])) + 1
+    return np.split(order, breaks)
+
+def _connected_components(pairs):
+    # Component label per pair in the bipartite caretaker-patient assignment graph
+    parent = {}
+
+    def find(node):
+        parent.setdefault(node, node)
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for c, p in pairs.tolist():
+        root_c, root_p = find(("c", c)), find(("p", p))
+        if root_c != root_p:
+            parent[root_p] = root_c
+    roots = {}
+    return np.array([roots.setdefault(find(("c", c)), len(roots)) for c in pairs[:, 0].tolist()], dtype=np.int32)
 
-    # 3. No Overlapping Appointments: A patient cannot be treated by more than one caretaker at the same hour
+def _create_variables(model, pairs, days, hours):
+    # x[k, d, h] is the index of the boolean variable for pair k (a caretaker-patient
+    # row of `pairs`) treating on day d at hour h. Variables only exist for real
+    # assignment pairs and are appended to the model proto directly, so no Python
+    # object is kept per variable.
+    variables = model.Proto().variables
+    first = len(variables)
+    count = len(pairs) * len(days) * len(hours)
+    for _ in range(count):
+        variables.add().domain.extend((0, 1))
+    return np.arange(first, first + count, dtype=np.int32).reshape(len(pairs), len(days), len(hours))
+
+def _add_constraints(model, x, pairs):
+    constraints = model.Proto().constraints
+    constraint_count = 0
+
+    # 1. No Overlapping Appointments: A patient cannot be treated by more than one caretaker at the same hour
     # This is a hard constraint that must be maintained
-    for p in patients:
-        for d in days:
-            for h in hours:
-                model.Add(sum(x[c, p, d, h] for c in caretakers if (c, p, d, h) in x) <= 1)
-                constraint_count += 1
+    for rows in _group_rows(pairs[:, 1]):
+        if len(rows) < 2:
+            continue
+        for slot in x[rows].reshape(len(rows), -1).T.tolist():
+            constraints.add().at_most_one.literals.extend(slot)
+            constraint_count += 1
 
-    # 4. Unique Caretaker Per Day Per Patient: A patient cannot be treated by the same caretaker more than once on the same day
+    # 2. Unique Caretaker Per Day Per Patient: A patient cannot be treated by the same caretaker more than once on the same day
     # This is our primary hard constraint that must be maintained
-    for c in caretakers:
-        for p in patients:
-            for d in days:
-                if (c, p) in assignments:
-                    model.Add(sum(x[c, p, d, h] for h in hours if (c, p, d, h) in x) <= 1)
-                    constraint_count += 1
+    for day_slots in x.reshape(-1, x.shape[2]).tolist():
+        constraints.add().at_most_one.literals.extend(day_slots)
+        constraint_count += 1
 
-    print(f"[DEBUG] Added {constraint_count} constraints")
     return constraint_count
 
-def _extract_solution(solver, x):
-    schedule = []
-    for (c, p, d, h), var in x.items():
-        if solver.BooleanValue(var):
-            schedule.append({"Caretaker": c, "Patient": p, "Day": d, "Hour": h})
-    return schedule
+def _maximize_assigned(model, x, keep=None, scale=1):
+    # Objective: maximize the number of assigned slots. CP-SAT minimizes, so the
+    # coefficients are negated and the scaling factor flips the reported value.
+    # Slots set in `keep` earn a bonus of 1/scale of an assignment, so among equally
+    # full schedules the one closest to `keep` wins.
+    objective = model.Proto().objective
+    literals = x.ravel().tolist()
+    objective.vars.extend(literals)
+    if keep is None:
+        objective.coeffs.extend([-scale] * len(literals))
+    else:
+        objective.coeffs.extend((-scale - keep.ravel()).tolist())
+    objective.scaling_factor = -1 / scale
+
+def _extract_solution(values, x, pairs, day_ids):
+    # Chosen slots as (caretaker, patient, day, hour) index rows
+    k, d, h = np.nonzero(values[x] == 1)
+    return np.column_stack((pairs[k, 0], pairs[k, 1], np.asarray(day_ids, dtype=np.int32)[d], h))
+
+def _slots_to_schedule(slots, caretakers, patients, days, hours):
+    return (
+        (caretakers[c], patients[p], days[d], hours[h])
+        for c, p, d, h in slots.tolist()
+    )
+
+def _build_model(units, num_hours, trace=None):
+    # A unit is a (pairs, day_ids) subproblem. Units never share a constraint, so
+    # several of them can be stacked into one model and solved together.
+    from ortools.sat.python import cp_model
+    trace = trace or telemetry.Trace()
+    model = cp_model.CpModel()
+    xs = []
+    constraint_count = 0
+    for pairs, day_ids in units:
+        with trace.stage("create_variables"):
+            x = _create_variables(model, pairs, day_ids, range(num_hours))
+        with trace.stage("add_constraints"):
+            constraint_count += _add_constraints(model, x, pairs)
+            _maximize_assigned(model, x)
+        xs.append(x)
+    print(f"[DEBUG] Added {constraint_count} constraints")
+    return model, xs
+
+def _slots_from_values(values, xs, units):
+    slots = [_extract_solution(values, x, pairs, day_ids) for x, (pairs, day_ids) in zip(xs, units)]
+    return np.concatenate(slots) if slots else np.empty((0, 4), dtype=np.int32)
+
+def _solution_streamer(xs, units, publish):
+    # Hands improving solutions to `publish` as they are found, at most once
+    # per STREAM_INTERVAL_IN_SECONDS so large schedules are not re-sent constantly.
+    # A solution found within the interval is held back, replaced by any better
+    # one, and sent with the next callback after it or by flush() once the solve ends.
+    # The class is built here because its base class lives in the lazily imported OR-Tools.
+    from ortools.sat.python import cp_model
+
+    class SolutionStreamer(cp_model.CpSolverSolutionCallback):
+        def __init__(self):
+            super().__init__()
+            self._last_published = None
+            self._pending = None
+
+        def on_solution_callback(self):
+            wall_time = self.WallTime()
+            objective = self.ObjectiveValue()
+            bound = self.BestObjectiveBound()
+            self._pending = (np.array(self.Response().solution, dtype=np.int8), {
+                "objective": objective,
+                "best_bound": bound,
+                "gap": telemetry.relative_gap(objective, bound),
+                "wall_time": wall_time,
+            })
+            if self._last_published is None or wall_time - self._last_published >= STREAM_INTERVAL_IN_SECONDS:
+                self._last_published = wall_time
+                self.flush()
+
+        def flush(self):
+            if self._pending is not None:
+                values, update = self._pending
+                self._pending = None
+                publish(_slots_from_values(values, xs, units), update)
+
+    return SolutionStreamer()
+
+def _stop_when(stop, should_stop, done):
+    # CP-SAT only calls back on new solutions, so a stop request is polled here
+    while not done.wait(0.1):
+        if should_stop():
+            stop()
+            return
+
+def _solve_units(units, num_hours, num_workers=None, max_time_in_seconds=MAX_TIME_IN_SECONDS,
+                 relative_gap_limit=None, on_solution=None, should_stop=None):
+    # Returns the trace as a dict so it can travel back from a worker process
+    from ortools.sat.python import cp_model
+    trace = telemetry.Trace()
+    model, xs = _build_model(units, num_hours, trace)
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = max_time_in_seconds
+    if relative_gap_limit is not None:
+        solver.parameters.relative_gap_limit = relative_gap_limit
+    if num_workers:
+        solver.parameters.num_workers = num_workers
+    callback = _solution_streamer(xs, units, on_solution) if on_solution else None
+    done = threading.Event()
+    if should_stop:
+        threading.Thread(target=_stop_when, args=(solver.StopSearch, should_stop, done), daemon=True).start()
+    with trace.stage("solve"):
+        status = solver.Solve(model, callback)
+    done.set()
+    if callback is not None:
+        callback.flush()
+    trace.solver = telemetry.solver_stats(solver, status)
+    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        return status, None, trace.to_dict()
+    with trace.stage("extract_solution"):
+        values = np.array(solver.ResponseProto().solution, dtype=np.int8)
+        slots = _slots_from_values(values, xs, units)
+    return status, slots, trace.to_dict()
+
+def _decompose(pairs, num_days, mode):
+    if mode == "day":
+        return [(pairs, [d]) for d in range(num_days)]
+    labels = _connected_components(pairs)
+    return [(pairs[rows], [d]) for rows in _group_rows(labels) for d in range(num_days)]
+
+def _pack_units(units, num_buckets):
+    # Largest-first greedy packing so every worker gets a similar number of variables
+    buckets = [[] for _ in range(min(num_buckets, len(units)))]
+    loads = [0] * len(buckets)
+    for unit in sorted(units, key=lambda u: len(u[0]) * len(u[1]), reverse=True):
+        i = loads.index(min(loads))
+        buckets[i].append(unit)
+        loads[i] += len(unit[0]) * len(unit[1])
+    return buckets
+
+_subproblems = None
+_subproblem_stop = None
+
+def _init_subproblem_worker(stop):
+    global _subproblem_stop
+    _subproblem_stop = stop
+
+def _solve_subproblem(bucket, num_hours, num_workers, max_time_in_seconds, relative_gap_limit):
+    return _solve_units(bucket, num_hours, num_workers, max_time_in_seconds, relative_gap_limit,
+                        should_stop=_subproblem_stop.is_set)
+
+def _subproblem_pool(size):
+    # One pool per process, reused across requests so decomposed solves do not
+    # pay process start-up every time. A process solves one request at a time,
+    # so a single stop event inherited by the pool's workers is enough.
+    # The pool's workers are not daemonic and are joined when the owning process
+    # exits, so a finalizer shuts the pool down first; its priority puts it ahead
+    # of the pool's own queue finalizers, which would close the call queue.
+    global _subproblems
+    if _subproblems is None or _subproblems[0] != size:
+        if _subproblems is not None:
+            _subproblems[3].cancel()
+            _subproblems[1].shutdown(wait=False)
+        stop = multiprocessing.Event()
+        pool = ProcessPoolExecutor(max_workers=size, initializer=_init_subproblem_worker, initargs=(stop,))
+        finalizer = multiprocessing.util.Finalize(pool, pool.shutdown, exitpriority=100)
+        _subproblems = (size, pool, stop, finalizer)
+    return _subproblems[1], _subproblems[2]
+
+def shutdown_subproblem_pool():
+    # Stops this process's subproblem workers now instead of at exit
+    global _subproblems
+    if _subproblems is not None:
+        _subproblems[3].cancel()
+        _subproblems[1].shutdown()
+        _subproblems = None
+
+def _solve_decomposed(pairs, num_days, num_hours, mode, max_workers, max_time_in_seconds,
+                      relative_gap_limit, trace, should_stop=None):
+    # max_workers is this solve's CPU budget: subproblem processes times CP-SAT
+    # workers each never exceed it
+    from ortools.sat.python import cp_model
+    budget = max_workers or os.cpu_count() or 1
+    buckets = _pack_units(_decompose(pairs, num_days, mode), budget)
+    if len(buckets) <= 1:
+        results = [_solve_units(buckets[0] if buckets else [], num_hours, budget, max_time_in_seconds,
+                                relative_gap_limit, should_stop=should_stop)]
+    else:
+        solver_workers = max(1, budget // len(buckets))
+        pool, stop = _subproblem_pool(budget)
+        stop.clear()
+        done = threading.Event()
+        if should_stop:
+            threading.Thread(target=_stop_when, args=(stop.set, should_stop, done), daemon=True).start()
+        try:
+            futures = [pool.submit(_solve_subproblem, bucket, num_hours, solver_workers, max_time_in_seconds, relative_gap_limit) for bucket in buckets]
+            results = [future.result() for future in futures]
+        finally:
+            done.set()
+    for _, _, sub_trace in results:
+        trace.merge(sub_trace)
+    for status, slots, _ in results:
+        if slots is None:
+            return status, None
+    status = cp_model.OPTIMAL if all(s == cp_model.OPTIMAL for s, _, _ in results) else cp_model.FEASIBLE
+    return status, np.concatenate([slots for _, slots, _ in results])
 
 def _format_output(schedule, original_caretakers=None):
-    import pandas as pd
-    df_out = pd.DataFrame(schedule)
-    # Build a mapping from caretaker name to optimized schedule
+    # Build a mapping from caretaker name to optimized schedule in one pass over
+    # the (caretaker, patient, day, hour) tuples
     optimized_schedules = {}
-    if not df_out.empty:
-        for c in df_out["Caretaker"].unique():
-            df_c = df_out[df_out["Caretaker"] == c]
-            day_hour = {}
-            for _, row in df_c.iterrows():
-                day = row["Day"]
-                hour = int(row["Hour"])
-                patient = row["Patient"]
-                day_hour.setdefault(day, {})[hour] = patient
-            optimized_schedules[c] = day_hour
+    for c, p, d, h in schedule:
+        optimized_schedules.setdefault(c, {}).setdefault(d, {})[int(h)] = p
     # If original_caretakers is provided, preserve order and extra fields
     if original_caretakers is not None:
         caretakers_list = []
@@ -102,37 +319,244 @@ def _format_output(schedule, original_caretakers=None):
     return {'caretakers': caretakers_list}
 
 
-def optimize_caretaker_schedule(caretaker_json):
-    days = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-    hours = list(range(8, 18))
-    df = caretaker_json_to_df(caretaker_json['caretakers'])
-    if df.empty:
+def optimize_caretaker_schedule(caretaker_json, decompose=None, max_workers=None, trace=None,
+                                max_time_in_seconds=MAX_TIME_IN_SECONDS, relative_gap_limit=None,
+                                on_solution=None, should_stop=None):
+    # Pass a telemetry.Trace as `trace` to collect stage timings and solver statistics.
+    # max_workers caps the cores the solve uses (all of them by default): CP-SAT
+    # threads, or subproblem processes times their threads when decomposed.
+    # The solve ends at max_time_in_seconds, once the relative gap between the best
+    # solution and the bound is within relative_gap_limit, or when should_stop()
+    # returns True. For monolithic solves on_solution(update) receives improving
+    # solutions as they are found: their objective, bound, gap and wall time, and
+    # the formatted schedule under 'result'.
+    from ortools.sat.python import cp_model
+    days = DAYS
+    hours = HOURS
+    trace = trace or telemetry.Trace()
+    if decompose is not None and decompose not in DECOMPOSE_MODES:
+        raise ValueError(f"Unknown decompose mode {decompose!r}, expected one of {DECOMPOSE_MODES}")
+    if decompose and on_solution is not None:
+        raise ValueError("on_solution streams undecomposed solves only")
+    with trace.stage("ingest"):
+        schedule, pairs = _ingest(caretaker_json['caretakers'])
+    if not len(pairs):
         return {'caretakers': []}
 
-    caretakers = df["Caretaker"].unique()
-    patients = df["Patient"].unique()
-    assignments = {(c, p) for c in caretakers for p in df[df["Caretaker"] == c]["Patient"].unique()}
-
-    model = cp_model.CpModel()
-    x = _create_variables(model, caretakers, patients, assignments, days, hours)
-    _add_constraints(model, x, caretakers, patients, assignments, days, hours)
-    
-    # Objective: Minimize total appointments while maximizing assigned slots
-    model.Minimize(sum(1000 - x[c, p, d, h] for (c, p, d, h) in x))
-
-    solver = cp_model.CpSolver()
-    solver.parameters.max_time_in_seconds = 60  # Add timeout to prevent long solving times
-    status = solver.Solve(model)
+    if decompose:
+        status, slots = _solve_decomposed(
+            pairs, len(days), len(hours), decompose, max_workers, max_time_in_seconds,
+            relative_gap_limit, trace, should_stop
+        )
+    else:
+        publish = None
+        if on_solution is not None:
+            def publish(slots, update):
+                solution = Schedule.from_slots(schedule.caretakers, schedule.patients, slots, days, hours)
+                on_solution(dict(update, result={'caretakers': solution.to_caretakers(caretaker_json['caretakers'])}))
+        status, slots, sub_trace = _solve_units(
+            [(pairs, range(len(days)))], len(hours), max_workers, max_time_in_seconds,
+            relative_gap_limit, publish, should_stop
+        )
+        trace.merge(sub_trace)
     print(f"[DEBUG] Solver status: {status} (OPTIMAL={cp_model.OPTIMAL}, FEASIBLE={cp_model.FEASIBLE})")
-    
-    if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
-        schedule = _extract_solution(solver, x)
-        print(f"[DEBUG] Found solution with {len(schedule)} assignments")
-        return _format_output(schedule, caretaker_json['caretakers'])
+
+    if slots is not None:
+        print(f"[DEBUG] Found solution with {len(slots)} assignments")
+        with trace.stage("format_output"):
+            solution = Schedule.from_slots(schedule.caretakers, schedule.patients, slots, days, hours)
+            return {'caretakers': solution.to_caretakers(caretaker_json['caretakers'])}
     else:
         print("[DEBUG] No feasible solution found. Returning original input.")
         return {'caretakers': caretaker_json['caretakers']}
 
+DELTA_KEYS = (
+    "add_caretakers", "remove_caretakers", "add_patients", "remove_patients",
+    "add_assignments", "remove_assignments", "unavailable",
+)
+
+def validate_delta(delta):
+    # Raises ValueError unless `delta` has the shape reoptimize_caretaker_schedule
+    # documents; the schedules of add_caretakers are checked like any other payload
+    if not isinstance(delta, dict):
+        raise ValueError("delta must be an object")
+    unknown = set(delta) - set(DELTA_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown delta keys {sorted(unknown)}, expected some of {list(DELTA_KEYS)}")
+    for key in ("add_caretakers", "remove_caretakers", "remove_patients", "add_assignments",
+                "remove_assignments", "unavailable"):
+        if not isinstance(delta.get(key, []), list):
+            raise ValueError(f"{key} must be a list")
+    for key in ("remove_caretakers", "remove_patients"):
+        if not all(isinstance(name, str) for name in delta.get(key, [])):
+            raise ValueError(f"{key} must list names")
+    for key in ("add_assignments", "remove_assignments"):
+        for entry in delta.get(key, []):
+            if not isinstance(entry, dict) or not isinstance(entry.get('caretaker'), str) \
+                    or not isinstance(entry.get('patient'), str):
+                raise ValueError(f"Every entry of {key} needs a 'caretaker' and a 'patient' name")
+    add_patients = delta.get('add_patients', {})
+    if not isinstance(add_patients, dict) or not all(
+        isinstance(names, list) and all(isinstance(name, str) for name in names) for names in add_patients.values()
+    ):
+        raise ValueError("add_patients must map each patient to a list of caretaker names")
+    for entry in delta.get('unavailable', []):
+        if not isinstance(entry, dict) or not isinstance(entry.get('caretaker'), str):
+            raise ValueError("Every entry of unavailable needs a 'caretaker' name and a 'day'")
+        if entry.get('day') not in DAYS:
+            raise ValueError(f"Unknown day {entry.get('day')!r} in unavailable, expected one of {DAYS}")
+        hours = entry.get('hours', HOURS)
+        if not isinstance(hours, list):
+            raise ValueError("unavailable hours must be a list")
+        for hour in hours:
+            try:
+                valid = int(hour) in HOURS
+            except (TypeError, ValueError):
+                valid = False
+            if not valid:
+                raise ValueError(f"Unavailable hour {hour!r} is outside {HOURS[0]}-{HOURS[-1]}")
+    return delta
+
+def _apply_delta(previous_caretakers, delta):
+    removed_caretakers = set(delta.get('remove_caretakers', []))
+    removed_patients = set(delta.get('remove_patients', []))
+    removed_pairs = {(a['caretaker'], a['patient']) for a in delta.get('remove_assignments', [])}
+    added_pairs = {(a['caretaker'], a['patient']) for a in delta.get('add_assignments', [])}
+    for patient, names in delta.get('add_patients', {}).items():
+        added_pairs.update((c, patient) for c in names)
+    blocked = set()
+    for entry in delta.get('unavailable', []):
+        for hour in entry.get('hours', HOURS):
+            blocked.add((entry['caretaker'], entry['day'], int(hour)))
+
+    caretakers = [c for c in previous_caretakers if c.get('name') not in removed_caretakers]
+    caretakers += delta.get('add_caretakers', [])
+    pairs = {(c, p) for c, p, _, _ in _schedule_slots(caretakers)} | added_pairs
+    pairs = {
+        (c, p) for c, p in pairs - removed_pairs
+        if c not in removed_caretakers and p not in removed_patients
+    }
+    return caretakers, pairs, blocked
+
+def _affected_patient_days(previous, hinted, pairs, blocked):
+    # Patients whose set of caretakers changed are re-solved for the whole week;
+    # a caretaker becoming unavailable only touches the days of the slots it loses.
+    previous_pairs = {(c, p) for c, p, _, _ in previous}
+    changed = {p for _, p in previous_pairs ^ pairs} | {p for c, p, _, _ in hinted - previous}
+    affected = {(p, d) for p in changed for d in DAYS}
+    affected.update((p, d) for c, p, d, h in previous if (c, d, h) in blocked)
+    return affected
+
+def reoptimize_caretaker_schedule(previous_json, delta, max_time_in_seconds=REOPTIMIZE_TIME_IN_SECONDS, trace=None):
+    """Re-solve only the part of a published schedule touched by `delta`.
+
+    `previous_json` is the current schedule in the optimize_caretaker_schedule
+    output format. `delta` may contain any of:
+      add_caretakers:     [{'name', 'schedule'}, ...] (the schedule is used as a hint)
+      remove_caretakers:  [name, ...]
+      add_patients:       {patient: [caretaker name, ...]}
+      remove_patients:    [patient, ...]
+      add_assignments:    [{'caretaker', 'patient'}, ...]
+      remove_assignments: [{'caretaker', 'patient'}, ...]
+      unavailable:        [{'caretaker', 'day', 'hours' (default: whole day)}, ...]
+    Slots of untouched patient-days are kept as they are. The affected ones are
+    re-solved with the previous assignment as a solver hint and as a tie-breaker,
+    so the published schedule changes as little as possible. A telemetry.Trace
+    passed as `trace` also records how many patient-days were re-solved.
+    """
+    from ortools.sat.python import cp_model
+    trace = trace or telemetry.Trace()
+    with trace.stage("ingest"):
+        caretakers_json, pairs, blocked = _apply_delta(previous_json['caretakers'], delta)
+    previous = {
+        (c, p, d, h) for c, p, d, h in _schedule_slots(previous_json['caretakers'])
+        if (c, p) in pairs and (c, d, h) not in blocked
+    }
+    hinted = previous | {
+        (c, p, d, h) for c, p, d, h in _schedule_slots(delta.get('add_caretakers', []))
+        if (c, p) in pairs and (c, d, h) not in blocked
+    }
+    affected = _affected_patient_days(
+        set(_schedule_slots(previous_json['caretakers'])), hinted, pairs, blocked
+    )
+    kept = [slot for slot in previous if (slot[1], slot[2]) not in affected]
+    # Caretaker-hours already taken by a kept visit are as closed as unavailable ones
+    closed_hours = blocked | {(c, d, h) for c, _, d, h in kept}
+
+    caretakers = sorted({c for c, _ in pairs})
+    patients = sorted({p for _, p in pairs})
+    caretaker_index = {c: i for i, c in enumerate(caretakers)}
+    patient_index = {p: i for i, p in enumerate(patients)}
+    hour_index = {h: i for i, h in enumerate(HOURS)}
+    units = []
+    for d, day in enumerate(DAYS):
+        day_pairs = sorted(
+            (caretaker_index[c], patient_index[p]) for c, p in pairs if (p, day) in affected
+        )
+        if day_pairs:
+            units.append((np.array(day_pairs, dtype=np.int32), [d]))
+
+    model = cp_model.CpModel()
+    proto = model.Proto()
+    scale = sum(len(pairs_d) for pairs_d, _ in units) * len(HOURS) + 1
+    xs = []
+    for unit_pairs, day_ids in units:
+        day = DAYS[day_ids[0]]
+        row_of = {pair: k for k, pair in enumerate(map(tuple, unit_pairs.tolist()))}
+        keep = np.zeros((len(unit_pairs), 1, len(HOURS)), dtype=np.int64)
+        closed = []
+        x = _create_variables(model, unit_pairs, day_ids, HOURS)
+        for c, p, d, h in hinted:
+            if d == day and (p, d) in affected:
+                keep[row_of[caretaker_index[c], patient_index[p]], 0, hour_index[h]] = 1
+        for c, d, h in closed_hours:
+            if d == day and c in caretaker_index:
+                closed.extend(x[unit_pairs[:, 0] == caretaker_index[c], 0, hour_index[h]].tolist())
+        _add_constraints(model, x, unit_pairs)
+        _maximize_assigned(model, x, keep, scale)
+        if closed:
+            # The caretaker is unavailable or busy with a kept visit in these slots
+            linear = proto.constraints.add().linear
+            linear.vars.extend(closed)
+            linear.coeffs.extend([1] * len(closed))
+            linear.domain.extend((0, 0))
+        proto.solution_hint.vars.extend(x.ravel().tolist())
+        proto.solution_hint.values.extend(keep.ravel().tolist())
+        xs.append(x)
+
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = max_time_in_seconds
+    with trace.stage("solve"):
+        status = solver.Solve(model)
+    trace.solver = dict(telemetry.solver_stats(solver, status), affected_patient_days=len(affected))
+    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        return {'caretakers': previous_json['caretakers'], 'changes': {'added': 0, 'removed': 0}}
+
+    with trace.stage("extract_solution"):
+        values = np.array(solver.ResponseProto().solution, dtype=np.int8)
+        slots = [_extract_solution(values, x, unit_pairs, day_ids) for x, (unit_pairs, day_ids) in zip(xs, units)]
+    with trace.stage("format_output"):
+        current = set(kept)
+        if slots:
+            current.update(_slots_to_schedule(np.concatenate(slots), caretakers, patients, DAYS, HOURS))
+        result = _format_output(current, caretakers_json)
+        published = set(_schedule_slots(previous_json['caretakers']))
+        current = set(_schedule_slots(result['caretakers']))
+        result['changes'] = {'added': len(current - published), 'removed': len(published - current)}
+    return result
+
+def warm_up():
+    # Run once per solving process before real requests arrive: imports OR-Tools and
+    # takes a tiny synthetic instance through ingest, model building, solving and
+    # formatting, then re-optimizes it, so the first request does not pay for any of it
+    caretakers = [
+        {'name': f"warm-up {c}", 'schedule': {day: {str(hour): f"P{(c + hour) % 3}" for hour in HOURS[:4]} for day in DAYS[:2]}}
+        for c in range(2)
+    ]
+    result = optimize_caretaker_schedule({'caretakers': caretakers}, max_time_in_seconds=1)
+    delta = {'unavailable': [{'caretaker': "warm-up 0", 'day': DAYS[0], 'hours': HOURS[:1]}]}
+    return reoptimize_caretaker_schedule(result, delta, max_time_in_seconds=1)
+
 if __name__ == "__main__":
     data = {'caretakers': [{'name': 'Paula (nurse)', 'schedule': {'Sunday': {'8': 'P022', '9': 'P023', '10': 'P024', '11': 'P025', '12': 'P026', '13': 'P027', '14': 'P028'}, 'Monday': {'8': 'P024', '10': 'P028', '11': 'P025', '12': 'P011', '14': 'P010', '17': 'P020'}, 'Tuesday': {'8': 'P008', '9': 'P009', '10': 'P017', '11': 'P021', '12': 'P026', '13': 'P023', '14': 'P014'}, 'Wednesday': {'8': 'P027', '9': 'P016', '10': 'P017', '11': 'P018', '12': 'P019', '13': 'P020', '14': 'P021'}, 'Thursday': {'11': 'P004', '13': 'P021', '14': 'P027', '17': 'P020'}, 'Friday': {'8': 'P001', '9': 'P002', '10': 'P003', '11': 'P013', '12': 'P020', '13': 'P006', '14': 'P007', '15': 'P028', '16': 'P008'}}}, {'name': 'Mila (care_assistant)', 'schedule': {'Sunday': {'8': 'P079', '9': 'P080', '10': 'P072', '11': 'P066', '12': 'P005', '13': 'P049', '14': 'P017', '15': 'P018', '17': 'P070'}, 'Monday': {'8': 'P053', '9': 'P075', '10': 'P049', '11': 'P070', '12': 'P063', '13': 'P073', '14': 'P080', '15': 'P051'}, 'Tuesday': {'9': 'P049', '11': 'P017', '12': 'P070', '13': 'P039'}, 'Wednesday': {'11': 'P051', '14': 'P017', '16': 'P026', '17': 'P079'}, 'Thursday': {'10': 'P066', '13': 'P013', '14': 'P005', '15': 'P017', '17': 'P023'}, 'Friday': {'8': 'P039', '9': 'P001', '10': 'P023', '11': 'P080', '12': 'P062', '13': 'P063', '14': 'P013', '15': 'P070'}}}, {'name': 'Leo (doctor)', 'schedule': {'Sunday': {'8': 'P077', '9': 'P076', '10': 'P021', '11': 'P014', '12': 'P071', '14': 'P024', '17': 'P009'}, 'Monday': {'9': 'P014', '10': 'P022', '12': 'P077', '13': 'P060', '14': 'P024'}, 'Tuesday': {'8': 'P064', '9': 'P014', '10': 'P075', '12': 'P077', '13': 'P053', '14': 'P080', '15': 'P024'}, 'Wednesday': {'8': 'P054', '9': 'P079', '10': 'P010', '11': 'P025', '12': 'P076', '13': 'P080', '14': 'P078'}, 'Thursday': {'8': 'P047', '9': 'P009', '10': 'P075', '11': 'P060', '12': 'P013', '13': 'P018', '14': 'P028'}, 'Friday': {'8': 'P076', '9': 'P075', '11': 'P018', '12': 'P071', '13': 'P025', '14': 'P001', '15': 'P079'}}}, {'name': 'Diana (therapist)', 'schedule': {'Sunday': {'13': 'P068', '15': 'P032'}, 'Monday': {'16': 'P032'}, 'Tuesday': {'12': 'P032', '15': 'P072', '16': 'P068'}, 'Wednesday': {}, 'Thursday': {'13': 'P072'}, 'Friday': {'13': 'P001'}}}, {'name': 'Victor (therapist)', 'schedule': {'Sunday': {'8': 'P008', '10': 'P019', '11': 'P026', '12': 'P079', '13': 'P029', '14': 'P027', '16': 'P066'}, 'Monday': {'9': 'P064', '11': 'P065', '12': 'P019', '13': 'P031', '14': 'P008', '15': 'P061', '16': 'P007'}, 'Tuesday': {'9': 'P007', '10': 'P021', '11': 'P060', '12': 'P018', '13': 'P027', '14': 'P034', '15': 'P024', '16': 'P011'}, 'Wednesday': {'8': 'P026', '10': 'P037', '12': 'P002'}, 'Thursday': {'9': 'P037', '11': 'P065', '12': 'P061', '13': 'P030', '14': 'P019', '15': 'P007', '16': 'P064', '17': 'P027'}, 'Friday': {'9': 'P019', '10': 'P018', '11': 'P079', '12': 'P030', '13': 'P031', '15': 'P061'}}}, {'name': 'Frank (care_assistant)', 'schedule': {'Sunday': {'12': 'P077', '13': 'P028', '14': 'P058'}, 'Monday': {'10': 'P028', '11': 'P065', '12': 'P044', '13': 'P040', '14': 'P042', '15': 'P037', '16': 'P041', '17': 'P050'}, 'Tuesday': {'10': 'P012', '12': 'P027', '13': 'P058', '14': 'P055', '15': 'P016', '16': 'P056', '17': 'P044'}, 'Wednesday': {'8': 'P055', '10': 'P046', '11': 'P065', '12': 'P025', '13': 'P077', '14': 'P010', '15': 'P011'}, 'Thursday': {'11': 'P058', '13': 'P046', '14': 'P015', '16': 'P037', '17': 'P055'}, 'Friday': {'8': 'P044', '10': 'P027', '11': 'P040', '12': 'P042', '13': 'P065', '14': 'P028', '15': 'P041', '16': 'P058', '17': 'P002'}}}, {'name': 'Carmen (doctor)', 'schedule': {'Sunday': {'10': 'P012', '11': 'P059', '13': 'P015', '14': 'P020'}, 'Monday': {'8': 'P048', '9': 'P062', '10': 'P069', '11': 'P015', '12': 'P002', '13': 'P061'}, 'Tuesday': {'8': 'P059', '9': 'P004', '10': 'P061', '11': 'P068', '12': 'P003', '13': 'P072'}, 'Wednesday': {'10': 'P051', '13': 'P011'}, 'Thursday': {'9': 'P065', '10': 'P011', '11': 'P062', '12': 'P072', '13': 'P015', '14': 'P012'}, 'Friday': {'8': 'P020', '9': 'P027', '12': 'P007', '14': 'P070'}}}, {'name': 'Ben (psychologist)', 'schedule': {'Sunday': {'9': 'P011', '10': 'P040', '11': 'P005', '12': 'P047', '13': 'P057', '16': 'P038'}, 'Monday': {'10': 'P049', '12': 'P026', '13': 'P036', '15': 'P055', '16': 'P014', '17': 'P034'}, 'Tuesday': {'9': 'P049', '10': 'P057', '11': 'P036', '12': 'P004', '13': 'P011', '14': 'P055', '15': 'P079', '16': 'P046', '17': 'P040'}, 'Wednesday': {'9': 'P017', '10': 'P079', '12': 'P004', '13': 'P049', '17': 'P036'}, 'Thursday': {'9': 'P002', '12': 'P017'}, 'Friday': {'9': 'P014', '11': 'P055', '12': 'P040', '13': 'P057', '14': 'P013', '15': 'P038', '17': 'P022'}}}, {'name': 'Karen (therapist)', 'schedule': {'Sunday': {'9': 'P004', '10': 'P062', '11': 'P078', '12': 'P044', '15': 'P028'}, 'Monday': {'8': 'P078', '10': 'P009', '12': 'P075', '13': 'P003', '15': 'P063'}, 'Tuesday': {'8': 'P004', '11': 'P009', '14': 'P063', '15': 'P003', '17': 'P075'}, 'Wednesday': {'8': 'P022', '9': 'P006', '11': 'P076', '12': 'P003', '13': 'P078', '14': 'P063'}, 'Thursday': {}, 'Friday': {'10': 'P044', '11': 'P009', '12': 'P076'}}}, {'name': 'Wendy (psychologist)', 'schedule': {'Sunday': {'9': 'P041', '11': 'P006', '12': 'P032', '13': 'P045'}, 'Monday': {'12': 'P027', '13': 'P045'}, 'Tuesday': {}, 'Wednesday': {}, 'Thursday': {'11': 'P029'}, 'Friday': {}}}, {'name': 'Hannah (care_assistant)', 'schedule': {'Sunday': {'10': 'P004', '15': 'P019', '16': 'P036'}, 'Monday': {'8': 'P060', '16': 'P030', '17': 'P057'}, 'Tuesday': {}, 'Wednesday': {'12': 'P004'}, 'Thursday': {'12': 'P078', '15': 'P060'}, 'Friday': {'10': 'P019', '12': 'P060', '13': 'P054', '17': 'P033'}}}, {'name': 'Laura (therapist)', 'schedule': {'Sunday': {'15': 'P080', '17': 'P016'}, 'Monday': {}, 'Tuesday': {'10': 'P042', '12': 'P016', '13': 'P080'}, 'Wednesday': {}, 'Thursday': {'14': 'P080', '15': 'P013'}, 'Friday': {'13': 'P013', '14': 'P005'}}}, {'name': 'Uma (doctor)', 'schedule': {'Sunday': {}, 'Monday': {}, 'Tuesday': {'12': 'P073'}, 'Wednesday': {'14': 'P005'}, 'Thursday': {'11': 'P073'}, 'Friday': {'12': 'P073'}}}, {'name': 'Noah (care_assistant)', 'schedule': {'Sunday': {'11': 'P021', '13': 'P031', '14': 'P029'}, 'Monday': {'9': 'P045', '11': 'P008', '12': 'P031', '13': 'P068', '14': 'P052', '15': 'P024', '17': 'P021'}, 'Tuesday': {'8': 'P021', '13': 'P068', '14': 'P045', '15': 'P008', '17': 'P031'}, 'Wednesday': {'9': 'P021', '12': 'P067', '13': 'P024'}, 'Thursday': {'12': 'P029', '13': 'P006', '14': 'P032'}, 'Friday': {'11': 'P067', '12': 'P021', '13': 'P006', '14': 'P068'}}}, {'name': 'Julia (doctor)', 'schedule': {'Sunday': {'14': 'P023', '16': 'P006'}, 'Monday': {}, 'Tuesday': {'13': 'P063'}, 'Wednesday': {}, 'Thursday': {}, 'Friday': {'13': 'P050'}}}, {'name': 'Nina (psychologist)', 'schedule': {'Sunday': {}, 'Monday': {'9': 'P007', '10': 'P053'}, 'Tuesday': {'12': 'P050'}, 'Wednesday': {'11': 'P053'}, 'Thursday': {'10': 'P044'}, 'Friday': {}}}, {'name': 'Fiona (care_assistant)', 'schedule': {'Sunday': {}, 'Monday': {'11': 'P074', '12': 'P020'}, 'Tuesday': {'11': 'P007', '13': 'P035'}, 'Wednesday': {'10': 'P009'}, 'Thursday': {'8': 'P007', '9': 'P069'}, 'Friday': {'9': 'P064'}}}, {'name': 'Isla (psychologist)', 'schedule': {'Sunday': {'8': 'P019', '11': 'P030', '13': 'P009'}, 'Monday': {'11': 'P033', '12': 'P018', '13': 'P012', '14': 'P051'}, 'Tuesday': {'9': 'P037', '11': 'P080', '12': 'P058', '13': 'P018', '14': 'P019'}, 'Wednesday': {'11': 'P023', '12': 'P035', '13': 'P019', '14': 'P031', '16': 'P037'}, 'Thursday': {'8': 'P080', '9': 'P031', '13': 'P009'}, 'Friday': {'9': 'P035', '10': 'P012', '11': 'P080', '12': 'P018', '13': 'P023', '14': 'P058'}}}, {'name': 'Charlie (therapist)', 'schedule': {'Sunday': {'10': 'P041'}, 'Monday': {'10': 'P059', '12': 'P073', '13': 'P038'}, 'Tuesday': {'9': 'P045', '12': 'P033', '13': 'P067'}, 'Wednesday': {'9': 'P010', '10': 'P077', '11': 'P038', '13': 'P017'}, 'Thursday': {'8': 'P020', '11': 'P041', '12': 'P039', '13': 'P038', '16': 'P035'}, 'Friday': {'8': 'P035', '9': 'P045', '12': 'P073', '14': 'P077'}}}, {'name': 'Abby (doctor)', 'schedule': {'Sunday': {'11': 'P019', '13': 'P074'}, 'Monday': {}, 'Tuesday': {'10': 'P017', '13': 'P016'}, 'Wednesday': {}, 'Thursday': {'10': 'P058', '15': 'P074'}, 'Friday': {'11': 'P016', '17': 'P074'}}}, {'name': 'Ivan (psychologist)', 'schedule': {'Sunday': {'10': 'P024', '11': 'P016', '12': 'P048'}, 'Monday': {'8': 'P016'}, 'Tuesday': {'11': 'P028', '12': 'P025', '13': 'P056'}, 'Wednesday': {'9': 'P042', '13': 'P024'}, 'Thursday': {'12': 'P048'}, 'Friday': {'12': 'P042'}}}, {'name': 'Gina (doctor)', 'schedule': {'Sunday': {'10': 'P044', '11': 'P030', '12': 'P042', '13': 'P046', '14': 'P040', '15': 'P039'}, 'Monday': {'8': 'P044', '11': 'P041', '12': 'P036', '13': 'P037', '14': 'P038', '15': 'P039', '16': 'P040'}, 'Tuesday': {'11': 'P041', '12': 'P042', '13': 'P043', '14': 'P044', '15': 'P045', '16': 'P046', '17': 'P029'}, 'Wednesday': {'11': 'P040', '12': 'P030', '13': 'P031', '14': 'P032', '15': 'P039', '16': 'P034'}, 'Thursday': {'12': 'P046', '13': 'P041', '14': 'P029'}, 'Friday': {'10': 'P038', '11': 'P044', '13': 'P036', '14': 'P042', '15': 'P033', '16': 'P046'}}}, {'name': 'Yara (nurse)', 'schedule': {'Sunday': {}, 'Monday': {'13': 'P072', '15': 'P059'}, 'Tuesday': {'9': 'P069', '13': 'P039'}, 'Wednesday': {'11': 'P069', '13': 'P080', '14': 'P053', '15': 'P072', '16': 'P066'}, 'Thursday': {'11': 'P030', '12': 'P069'}, 'Friday': {'11': 'P053', '13': 'P080', '14': 'P030', '16': 'P059'}}}, {'name': 'Harold (nurse)', 'schedule': {'Sunday': {}, 'Monday': {'11': 'P031', '14': 'P055'}, 'Tuesday': {}, 'Wednesday': {'11': 'P050', '13': 'P075', '15': 'P036'}, 'Thursday': {}, 'Friday': {'14': 'P036'}}}, {'name': 'Quinn (nurse)', 'schedule': {'Sunday': {}, 'Monday': {'11': 'P052', '14': 'P032'}, 'Tuesday': {'15': 'P068'}, 'Wednesday': {'10': 'P037'}, 'Thursday': {'9': 'P071', '10': 'P052', '15': 'P048'}, 'Friday': {}}}, {'name': 'Xander (nurse)', 'schedule': {'Sunday': {'9': 'P062', '10': 'P077', '11': 'P064'}, 'Monday': {'15': 'P056'}, 'Tuesday': {'8': 'P062', '9': 'P056', '11': 'P045', '14': 'P064'}, 'Wednesday': {'8': 'P077', '11': 'P035', '12': 'P064'}, 'Thursday': {}, 'Friday': {}}}, {'name': 'Zane (nurse)', 'schedule': {'Sunday': {}, 'Monday': {'9': 'P049', '12': 'P058', '13': 'P046', '15': 'P044', '16': 'P042'}, 'Tuesday': {'12': 'P044', '14': 'P060', '15': 'P049', '16': 'P040'}, 'Wednesday': {'9': 'P049', '12': 'P058', '14': 'P051'}, 'Thursday': {'8': 'P058', '12': 'P042', '14': 'P049', '15': 'P040', '16': 'P044'}, 'Friday': {'12': 'P060', '13': 'P074', '14': 'P067', '15': 'P073', '17': 'P058'}}}, {'name': 'Eli (therapist)', 'schedule': {'Sunday': {'12': 'P048', '13': 'P053', '14': 'P055', '15': 'P056', '16': 'P054'}, 'Monday': {'9': 'P047', '10': 'P051', '11': 'P049', '12': 'P050', '14': 'P057', '17': 'P054'}, 'Tuesday': {'10': 'P053'}, 'Wednesday': {'15': 'P058'}, 'Thursday': {'9': 'P055', '10': 'P056', '11': 'P057', '12': 'P058'}, 'Friday': {'9': 'P051', '10': 'P052', '11': 'P053', '12': 'P054', '16': 'P050', '17': 'P055'}}}, {'name': 'Bob (psychologist)', 'schedule': {'Sunday': {'9': 'P068', '10': 'P076', '12': 'P077', '13': 'P065', '14': 'P072', '15': 'P074', '17': 'P067'}, 'Monday': {'9': 'P076', '11': 'P075', '12': 'P077', '13': 'P063', '14': 'P059'}, 'Tuesday': {'8': 'P069', '9': 'P070', '10': 'P071', '11': 'P072', '12': 'P073', '13': 'P078'}, 'Wednesday': {'8': 'P064', '9': 'P065', '10': 'P066', '11': 'P067', '12': 'P072', '14': 'P071', '15': 'P076'}, 'Thursday': {'8': 'P059', '9': 'P060', '10': 'P075', '11': 'P066', '12': 'P063', '13': 'P077'}, 'Friday': {'8': 'P074', '9': 'P075', '10': 'P076', '11': 'P077', '12': 'P078', '16': 'P061'}}}]}
     result = optimize_caretaker_schedule(data)
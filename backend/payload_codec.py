@@ -0,0 +1,132 @@
+import json
+import zlib
+
+from schedule_core import DAYS, HOURS, Schedule
+
+# Optional fast paths; the plain JSON path works without any of them
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+MSGPACK_TYPES = (MSGPACK, "application/x-msgpack")
+MAX_DECODED_BYTES = 256 * 1024 * 1024
+
+
+class UnsupportedPayloadError(ValueError):
+    pass
+
+
+def _gunzip(data):
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        decoded = decompressor.decompress(data, MAX_DECODED_BYTES)
+    except zlib.error as e:
+        raise ValueError(f"Corrupt gzip payload: {e}") from e
+    if decompressor.unconsumed_tail:
+        raise ValueError(f"Decompressed payload exceeds {MAX_DECODED_BYTES} bytes")
+    return decoded
+
+
+def _unzstd(data):
+    if zstandard is None:
+        raise UnsupportedPayloadError("zstd payloads need the 'zstandard' package")
+    try:
+        return zstandard.ZstdDecompressor().decompress(data, max_output_size=MAX_DECODED_BYTES)
+    except zstandard.ZstdError as e:
+        raise ValueError(f"Corrupt zstd payload: {e}") from e
+
+
+def decompress(body, content_encoding=None):
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding == "gzip":
+        return _gunzip(body)
+    if encoding == "zstd":
+        return _unzstd(body)
+    if encoding == "identity":
+        return body
+    raise UnsupportedPayloadError(f"Unsupported Content-Encoding {content_encoding!r}")
+
+
+def loads(data, content_type=None):
+    media_type = (content_type or JSON).split(";")[0].strip().lower()
+    if media_type in MSGPACK_TYPES:
+        if msgpack is None:
+            raise UnsupportedPayloadError("MessagePack payloads need the 'msgpack' package")
+        return msgpack.unpackb(data, strict_map_key=False)
+    if media_type == JSON:
+        return orjson.loads(data) if orjson is not None else json.loads(data)
+    raise UnsupportedPayloadError(f"Unsupported Content-Type {content_type!r}")
+
+
+def from_columnar(payload):
+    """Expand a columnar payload into the regular {'caretakers': [...]} schedule.
+
+    The columnar form lists caretaker and patient names once and encodes every
+    slot as an integer in `grid`, a flat caretaker-major (caretaker, day, hour)
+    array holding the patient index or -1 for an empty slot; it is the wire form
+    of schedule_core.Schedule.
+    """
+    return {"caretakers": Schedule.from_columnar(payload).to_caretakers()}
+
+
+def to_columnar(result, days=DAYS, hours=HOURS):
+    return Schedule.from_caretakers(result["caretakers"], days, hours).to_columnar()
+
+
+def validate_schedule(payload):
+    """Check the {'caretakers': [{'name', 'schedule': {day: {hour: patient}}}]} shape.
+
+    Raises ValueError on the first problem, so malformed payloads are rejected
+    before they reach the cache or a solver worker.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("Schedule payload must be an object")
+    caretakers = payload.get("caretakers")
+    if not isinstance(caretakers, list):
+        raise ValueError("Schedule payload must contain a 'caretakers' list")
+    for caretaker in caretakers:
+        if not isinstance(caretaker, dict):
+            raise ValueError("Every caretaker must be an object")
+        name = caretaker.get("name")
+        schedule = caretaker.get("schedule", {})
+        if not isinstance(schedule, dict):
+            raise ValueError(f"Schedule of {name!r} must be an object")
+        for day, hour_map in schedule.items():
+            if not isinstance(hour_map, dict):
+                raise ValueError(f"Schedule of {name!r} on {day!r} must be an object")
+            for hour, patient in hour_map.items():
+                try:
+                    int(hour)
+                except (TypeError, ValueError):
+                    raise ValueError(f"Hour {hour!r} of {name!r} on {day!r} is not an integer") from None
+                if not isinstance(patient, (str, int)):
+                    raise ValueError(f"Patient of {name!r} on {day!r} at {hour!r} must be a string")
+    return payload
+
+
+def decode_schedule(body, content_type=None, content_encoding=None):
+    payload = loads(decompress(body, content_encoding), content_type)
+    if isinstance(payload, dict) and payload.get("format") == "columnar":
+        return from_columnar(payload)
+    return validate_schedule(payload)
+
+
+def encode_result(result, accept=None):
+    """Serialize a result for the client's Accept header; returns (body, media_type)."""
+    accepted = [part.split(";")[0].strip().lower() for part in (accept or "").split(",")]
+    if msgpack is not None and any(media_type in MSGPACK_TYPES for media_type in accepted):
+        return msgpack.packb(to_columnar(result)), MSGPACK
+    if orjson is not None:
+        return orjson.dumps(result, option=orjson.OPT_NON_STR_KEYS), JSON
+    return json.dumps(result, separators=(",", ":")).encode(), JSON
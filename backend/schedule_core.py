@@ -0,0 +1,215 @@
+import numpy as np
+
+DAYS = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+HOURS = list(range(8, 18))
+EMPTY = -1
+
+
+def grid_dtype(num_patients):
+    return np.int16 if num_patients <= np.iinfo(np.int16).max else np.int32
+
+
+def labels(values, empty=None):
+    # Object array for vectorized id -> text lookups; EMPTY (-1) maps to `empty`
+    table = np.empty(len(values) + 1, dtype=object)
+    table[:-1] = values
+    table[-1] = empty
+    return table
+
+
+class NameTable:
+    """Interned names: every distinct name is stored once and referred to by index."""
+
+    __slots__ = ("names", "_ids")
+
+    def __init__(self, names=()):
+        self.names = []
+        self._ids = {}
+        for name in names:
+            self.intern(name)
+
+    def intern(self, name):
+        i = self._ids.get(name)
+        if i is None:
+            i = self._ids[name] = len(self.names)
+            self.names.append(name)
+        return i
+
+    def index(self, name):
+        return self._ids[name]
+
+    def labels(self, empty=None):
+        return labels(self.names, empty)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, i):
+        return self.names[i]
+
+    def __contains__(self, name):
+        return name in self._ids
+
+
+class Schedule:
+    """A week (or any span) of visits as one dense integer occupancy grid.
+
+    grid[c, d, h] holds the patient id seen by caretaker c on day d at hour h, or
+    EMPTY. Caretaker and patient names live once in their NameTables, so a slot
+    costs two bytes (four past 32767 patients) however long the names are.
+    """
+
+    __slots__ = ("caretakers", "patients", "days", "hours", "grid")
+
+    def __init__(self, caretakers, patients, grid, days=DAYS, hours=HOURS):
+        self.caretakers = caretakers
+        self.patients = patients
+        self.days = list(days)
+        self.hours = list(hours)
+        self.grid = grid
+
+    @classmethod
+    def empty(cls, caretakers, patients, days=DAYS, hours=HOURS):
+        grid = np.full((len(caretakers), len(days), len(hours)), EMPTY, dtype=grid_dtype(len(patients)))
+        return cls(caretakers, patients, grid, days, hours)
+
+    @classmethod
+    def from_caretakers(cls, caretakers_json, days=DAYS, hours=HOURS):
+        # Single pass over [{'name', 'schedule': {day: {hour: patient}}}]; any
+        # iterable works, so large payloads can be streamed in. Slots outside
+        # days x hours are ignored, as the optimizer never scheduled them
+        day_index = {day: i for i, day in enumerate(days)}
+        hour_index = {hour: i for i, hour in enumerate(hours)}
+        caretakers = NameTable()
+        patients = NameTable()
+        cs, ds, hs, ps = [], [], [], []
+        for caretaker in caretakers_json:
+            c = caretakers.intern(caretaker.get('name'))
+            for day, hour_map in caretaker.get('schedule', {}).items():
+                d = day_index.get(day)
+                if d is None:
+                    continue
+                for hour, patient in hour_map.items():
+                    h = hour_index.get(int(hour))
+                    if h is None:
+                        continue
+                    cs.append(c)
+                    ds.append(d)
+                    hs.append(h)
+                    ps.append(patients.intern(patient))
+        schedule = cls.empty(caretakers, patients, days, hours)
+        schedule.grid[cs, ds, hs] = ps
+        return schedule
+
+    @classmethod
+    def from_slots(cls, caretakers, patients, slots, days=DAYS, hours=HOURS):
+        # `slots` is an (n, 4) array of caretaker, patient, day and hour ids
+        schedule = cls.empty(caretakers, patients, days, hours)
+        schedule.grid[slots[:, 0], slots[:, 2], slots[:, 3]] = slots[:, 1]
+        return schedule
+
+    @classmethod
+    def from_columnar(cls, payload):
+        days = payload.get("days", DAYS)
+        hours = payload.get("hours", HOURS)
+        caretakers = NameTable(payload["caretakers"])
+        patients = NameTable(payload["patients"])
+        grid = np.asarray(payload["grid"], dtype=np.int64)
+        if grid.size != len(caretakers) * len(days) * len(hours):
+            raise ValueError("grid length must be caretakers x days x hours")
+        if grid.size and (grid.min() < EMPTY or grid.max() >= len(patients)):
+            raise ValueError("grid holds patient indices outside the patients list")
+        grid = grid.astype(grid_dtype(len(patients))).reshape(len(caretakers), len(days), len(hours))
+        return cls(caretakers, patients, grid, days, hours)
+
+    def to_columnar(self):
+        return {
+            "format": "columnar",
+            "caretakers": list(self.caretakers.names),
+            "patients": list(self.patients.names),
+            "days": self.days,
+            "hours": self.hours,
+            "grid": self.grid.ravel().tolist(),
+        }
+
+    def slots(self):
+        # (n, 4) caretaker, patient, day, hour ids of every filled slot
+        c, d, h = np.nonzero(self.grid != EMPTY)
+        return np.stack([c, self.grid[c, d, h], d, h], axis=1).astype(np.int32)
+
+    def pairs(self):
+        # Sorted unique (caretaker, patient) id pairs that share at least one slot
+        if not len(self.patients):
+            return np.empty((0, 2), dtype=np.int32)
+        c, d, h = np.nonzero(self.grid != EMPTY)
+        keys = np.unique(c.astype(np.int64) * len(self.patients) + self.grid[c, d, h])
+        return np.stack(np.divmod(keys, len(self.patients)), axis=1).astype(np.int32).reshape(-1, 2)
+
+    def to_caretakers(self, original=None):
+        """Caretaker-centric {'name', 'schedule': {day: {hour: patient}}} dicts.
+
+        With `original`, follows its order and keeps any extra fields of each
+        caretaker, as the optimizer output always has.
+        """
+        schedules = [{} for _ in range(len(self.caretakers))]
+        cs, ds, hs = np.nonzero(self.grid != EMPTY)
+        patient_names = self.patients.labels()[self.grid[cs, ds, hs]].tolist()
+        days = self.days
+        hours = self.hours
+        for c, d, h, patient in zip(cs.tolist(), ds.tolist(), hs.tolist(), patient_names):
+            schedules[c].setdefault(days[d], {})[hours[h]] = patient
+        if original is not None:
+            caretakers = []
+            for caretaker in original:
+                name = caretaker.get('name')
+                schedule = schedules[self.caretakers.index(name)] if name in self.caretakers else {}
+                caretakers.append(dict(caretaker, schedule=schedule))
+            return caretakers
+        return [{'name': name, 'schedule': schedule} for name, schedule in zip(self.caretakers.names, schedules)]
+
+    def patient_view(self):
+        return PatientView(self)
+
+
+class PatientView:
+    """Patient-centric access to a Schedule without copying its grid.
+
+    Filled cells are sorted by patient once; each patient's slots are then a
+    slice of that index (a NumPy view), like a CSR row.
+    """
+
+    __slots__ = ("schedule", "order", "offsets")
+
+    def __init__(self, schedule):
+        self.schedule = schedule
+        flat = schedule.grid.ravel()
+        order = np.argsort(flat, kind="stable")
+        self.order = order[np.searchsorted(flat[order], 0):]
+        counts = np.bincount(flat[self.order], minlength=len(schedule.patients))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def slots(self, patient):
+        # (caretaker, day, hour) id arrays of one patient's visits
+        p = patient if isinstance(patient, (int, np.integer)) else self.schedule.patients.index(patient)
+        cells = self.order[self.offsets[p]:self.offsets[p + 1]]
+        return np.unravel_index(cells, self.schedule.grid.shape)
+
+    def grid(self):
+        # (patient, day, hour) array of caretaker ids, EMPTY where the patient is free
+        schedule = self.schedule
+        c, d, h = np.unravel_index(self.order, schedule.grid.shape)
+        grid = np.full((len(schedule.patients), len(schedule.days), len(schedule.hours)), EMPTY, dtype=np.int32)
+        grid[schedule.grid[c, d, h], d, h] = c
+        return grid
+
+    def to_patients(self):
+        # {patient: {day: {hour: caretaker}}}
+        schedule = self.schedule
+        caretaker_names = schedule.caretakers.names
+        result = {}
+        for p, patient in enumerate(schedule.patients.names):
+            cs, ds, hs = self.slots(p)
+            hour_maps = result[patient] = {}
+            for c, d, h in zip(cs.tolist(), ds.tolist(), hs.tolist()):
+                hour_maps.setdefault(schedule.days[d], {})[schedule.hours[h]] = caretaker_names[c]
+        return result
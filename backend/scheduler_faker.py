@@ -1,11 +1,14 @@
 import random
 from collections import defaultdict
-from openpyxl import Workbook
 from itertools import cycle
 
+import numpy as np
+
+import excel_export
+import schedule_core
+from schedule_core import DAYS, HOURS, NameTable, Schedule
+
 PROFESSIONS = ["nurse", "doctor", "therapist", "psychologist", "care_assistant"]
-DAYS = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
-HOURS = list(range(8, 18))
 NAMES_POOL = [
     "Alice", "Bob", "Charlie", "Diana", "Eli", "Fiona", "George", "Hannah", "Ivan", "Julia",
     "Kevin", "Laura", "Mike", "Nina", "Oscar", "Paula", "Quinn", "Rita", "Steve", "Tina",
@@ -14,6 +17,8 @@ NAMES_POOL = [
 ]
 
 class Caretaker:
+    __slots__ = ("name", "profession", "working_days", "working_hours")
+
     def __init__(self, name, profession, working_days, working_hours):
         self.name = f"{name} ({profession})"
         self.profession = profession
@@ -21,6 +26,8 @@ class Caretaker:
         self.working_hours = working_hours
 
 class Patient:
+    __slots__ = ("pid", "assignments")
+
     def __init__(self, pid):
         self.pid = pid
         self.assignments = []
@@ -28,90 +35,93 @@ class Patient:
     def add_assignment(self, day, hour, caretaker_name, profession):
         self.assignments.append((day, hour, caretaker_name, profession))
 
+def caretaker_names(count, rng=random):
+    # Unique names from the pool; once it runs out, names repeat with a number
+    # appended ("Alice 2", "Bob 2", ...)
+    names = rng.sample(NAMES_POOL, min(count, len(NAMES_POOL)))
+    for i in range(len(NAMES_POOL), count):
+        names.append(f"{NAMES_POOL[i % len(NAMES_POOL)]} {i // len(NAMES_POOL) + 1}")
+    return names
+
 class Scheduler:
-    def __init__(self, num_caretakers=30, num_patients=80):
+    def __init__(self, num_caretakers=30, num_patients=80, seed=None):
         self.num_caretakers = num_caretakers
         self.num_patients = num_patients
+        self.rng = random.Random(seed)
         self.caretakers = []
         self.patients = []
 
     def generate_caretakers(self):
-        used_names = set()
         prof_cycle = cycle(PROFESSIONS)
-        for _ in range(self.num_caretakers):
-            while True:
-                name = random.choice(NAMES_POOL)
-                if name not in used_names:
-                    used_names.add(name)
-                    break
+        for name in caretaker_names(self.num_caretakers, self.rng):
             profession = next(prof_cycle)
-            working_days = random.sample(DAYS, random.randint(3, 6))
-            block_length = random.randint(4, 8)
-            start_hour = random.randint(8, 17 - block_length + 1)
+            working_days = self.rng.sample(DAYS, self.rng.randint(3, 6))
+            block_length = self.rng.randint(4, 8)
+            start_hour = self.rng.randint(8, 17 - block_length + 1)
             working_hours = list(range(start_hour, start_hour + block_length))
             self.caretakers.append(Caretaker(name, profession, working_days, working_hours))
 
+    def schedule(self):
+        # Compact view of the assignments; names are interned in caretaker and
+        # patient order so sheet and payload order follow the generator
+        caretakers = NameTable(ct.name for ct in self.caretakers)
+        patients = NameTable(patient.pid for patient in self.patients)
+        day_index = {day: i for i, day in enumerate(DAYS)}
+        hour_index = {hour: i for i, hour in enumerate(HOURS)}
+        cs, ds, hs, ps = [], [], [], []
+        for p, patient in enumerate(self.patients):
+            for d, h, cname, _ in patient.assignments:
+                cs.append(caretakers.index(cname))
+                ds.append(day_index[d])
+                hs.append(hour_index[h])
+                ps.append(p)
+        schedule = Schedule.empty(caretakers, patients, DAYS, HOURS)
+        schedule.grid[cs, ds, hs] = ps
+        return schedule
+
+    def patient_grid(self):
+        # (patient, day, hour) array of caretaker ids built from the assignments
+        # themselves: generated data can book a caretaker for two patients at
+        # once, and the caretaker grid of schedule() only holds one of them
+        caretaker_index = {ct.name: i for i, ct in enumerate(self.caretakers)}
+        day_index = {day: i for i, day in enumerate(DAYS)}
+        hour_index = {hour: i for i, hour in enumerate(HOURS)}
+        ps, ds, hs, cs = [], [], [], []
+        for p, patient in enumerate(self.patients):
+            for d, h, cname, _ in patient.assignments:
+                ps.append(p)
+                ds.append(day_index[d])
+                hs.append(hour_index[h])
+                cs.append(caretaker_index[cname])
+        grid = np.full((len(self.patients), len(DAYS), len(HOURS)), schedule_core.EMPTY, dtype=np.int32)
+        grid[ps, ds, hs] = cs
+        return grid
+
     def create_patient_workbook(self):
-        wb = Workbook()
-        wb.remove(wb.active)
-        for patient in self.patients:
-            grid = [["" for _ in DAYS] for _ in HOURS]
-            for d, h, cname, prof in patient.assignments:
-                r = HOURS.index(h)
-                c = DAYS.index(d)
-                grid[r][c] = f"{prof} ({cname.split()[0]})"
-            ws = wb.create_sheet(title=patient.pid)
-            ws.cell(row=1, column=1, value="Hour")
-            for col, day in enumerate(DAYS, 2):
-                ws.cell(row=1, column=col, value=day)
-            for row, hour in enumerate(HOURS, 2):
-                ws.cell(row=row, column=1, value=hour)
-                for col in range(2, len(DAYS) + 2):
-                    ws.cell(row=row, column=col, value=grid[row - 2][col - 2])
-        path = "patient_schedule_with_names.xlsx"
-        wb.save(path)
-        return path
+        labels = schedule_core.labels([f"{ct.profession} ({ct.name.split()[0]})" for ct in self.caretakers])
+        cells = labels[self.patient_grid()].transpose(0, 2, 1)
+        grids = list(zip((patient.pid for patient in self.patients), cells))
+        return excel_export.write_workbook("patient_schedule_with_names.xlsx", grids)
 
     def create_caretaker_workbook(self):
-        wb = Workbook()
-        wb.remove(wb.active)
-        schedule = defaultdict(lambda: [["" for _ in DAYS] for _ in HOURS])
-        for patient in self.patients:
-            for d, h, cname, _ in patient.assignments:
-                r = HOURS.index(h)
-                c = DAYS.index(d)
-                schedule[cname][r][c] = patient.pid
-        for cname, grid in schedule.items():
-            ws = wb.create_sheet(title=cname[:31])
-            ws.cell(row=1, column=1, value="Hour")
-            for col, day in enumerate(DAYS, 2):
-                ws.cell(row=1, column=col, value=day)
-            for row, hour in enumerate(HOURS, 2):
-                ws.cell(row=row, column=1, value=hour)
-                for col in range(2, len(DAYS) + 2):
-                    ws.cell(row=row, column=col, value=grid[row - 2][col - 2])
-        path = "caretaker_schedule_oop.xlsx"
-        wb.save(path)
-        return path
+        schedule = self.schedule()
+        busy = (schedule.grid >= 0).any(axis=(1, 2))
+        grids = [sheet for sheet, keep in zip(excel_export.caretaker_grids(schedule), busy) if keep]
+        return excel_export.write_workbook("caretaker_schedule_oop.xlsx", grids)
+
+    def caretaker_payload(self):
+        # Request body for /optimize-schedule/: {'caretakers': [{'name', 'schedule'}]}
+        return {'caretakers': self.schedule().to_caretakers()}
 
     def export_json(self):
         # Caretaker JSON: {caretaker: {day: {hour: patient}}}
-        caretaker_json = {}
-        for ct in self.caretakers:
-            grid = defaultdict(dict)
-            for patient in self.patients:
-                for d, h, cname, _ in patient.assignments:
-                    if cname == ct.name:
-                        grid[d][h] = patient.pid
-            caretaker_json[ct.name] = {day: hours for day, hours in grid.items()}
-
         # Patient JSON: {patient: {day: {hour: caretaker}}}
+        caretaker_json = {c['name']: c['schedule'] for c in self.schedule().to_caretakers()}
         patient_json = {}
         for patient in self.patients:
-            grid = defaultdict(dict)
+            hour_maps = patient_json[patient.pid] = {}
             for d, h, cname, _ in patient.assignments:
-                grid[d][h] = cname
-            patient_json[patient.pid] = {day: hours for day, hours in grid.items()}
+                hour_maps.setdefault(d, {})[h] = cname
 
         import json
         with open("caretaker_schedule.json", "w") as f:
@@ -149,7 +159,7 @@ class StrictScheduler(Scheduler):
                             self.patients.append(patient)
                             patient_id += 1
                         else:
-                            patient = random.choice(self.patients)
+                            patient = self.rng.choice(self.patients)
 
                         same_day_profs = [p for d, _, _, p in patient.assignments if d == day]
                         if ct.profession not in same_day_profs:
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def _canonical_schedule(schedule):
+    # Hour keys arrive as strings from JSON and as ints from Python callers;
+    # empty days carry no information.
+    return {
+        day: {str(int(hour)): patient for hour, patient in hour_map.items()}
+        for day, hour_map in (schedule or {}).items()
+        if hour_map
+    }
+
+
+def canonical_key(caretakers, **settings):
+    """Hash of a caretakers payload that ignores caretaker order and hour key types."""
+    entries = sorted(
+        json.dumps([c.get('name'), _canonical_schedule(c.get('schedule'))], sort_keys=True)
+        for c in caretakers
+    )
+    canonical = json.dumps({"caretakers": entries, "settings": settings}, sort_keys=True)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def solution_of(result):
+    # Cache only the optimized schedule per caretaker; order and extra fields come
+    # from whichever request hits the entry.
+    return {c.get('name'): c.get('schedule', {}) for c in result['caretakers']}
+
+
+def apply_solution(solution, caretakers):
+    return {'caretakers': [dict(c, schedule=solution.get(c.get('name'), {})) for c in caretakers]}
+
+
+class SolutionCache:
+    def __init__(self, max_entries=None, ttl_seconds=None, path=None):
+        self.max_entries = max_entries or int(os.environ.get("SCHEDULE_CACHE_SIZE", 256))
+        self.ttl_seconds = ttl_seconds or float(os.environ.get("SCHEDULE_CACHE_TTL", 3600))
+        self.path = path or os.environ.get("SCHEDULE_CACHE_DB")
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._db = None
+        if self.path:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS solutions (key TEXT PRIMARY KEY, value TEXT, stored_at REAL)"
+            )
+            self._db.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if now - stored_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return value
+                del self._entries[key]
+                self._counters["evictions"] += 1
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, stored_at FROM solutions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[1] <= self.ttl_seconds:
+                    value = json.loads(row[0])
+                    self._store(key, value, row[1])
+                    self._counters["disk_hits"] += 1
+                    return value
+                if row is not None:
+                    self._db.execute("DELETE FROM solutions WHERE key = ?", (key,))
+                    self._db.commit()
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._store(key, value, now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO solutions (key, value, stored_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), now),
+                )
+                self._db.execute("DELETE FROM solutions WHERE stored_at < ?", (now - self.ttl_seconds,))
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = sum(self._counters[k] for k in ("memory_hits", "disk_hits", "misses"))
+            hits = self._counters["memory_hits"] + self._counters["disk_hits"]
+            stats = dict(self._counters)
+            stats.update({
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "disk": self.path,
+            })
+            if self._db is not None:
+                stats["disk_entries"] = self._db.execute("SELECT COUNT(*) FROM solutions").fetchone()[0]
+        return stats
+
+    def _store(self, key, value, stored_at):
+        self._entries[key] = (stored_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
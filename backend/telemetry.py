@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+STAGES = (
+    "json_decode",
+    "ingest",
+    "create_variables",
+    "add_constraints",
+    "solve",
+    "extract_solution",
+    "format_output",
+)
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60)
+SUMMED_SOLVER_STATS = ("objective", "best_bound", "branches", "conflicts")
+SOLVED_STATUSES = ("OPTIMAL", "FEASIBLE")
+
+
+class Trace:
+    """Per-request stage timings and CP-SAT statistics."""
+
+    def __init__(self):
+        self.stages = {}
+        self.solver = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def merge(self, other):
+        # Combine a trace from a subproblem (possibly from another process):
+        # stage times add up, solver counts add up and wall time is the slowest one
+        for name, seconds in other["stages"].items():
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+        stats = other.get("solver")
+        if not stats:
+            return
+        # A trace that already merged subproblems brings its own count
+        subproblems = self.solver.get("subproblems", 0) + stats.get("subproblems", 1)
+        if not self.solver:
+            self.solver = dict(stats)
+        else:
+            for key in SUMMED_SOLVER_STATS:
+                self.solver[key] += stats[key]
+            self.solver["wall_time"] = max(self.solver["wall_time"], stats["wall_time"])
+            self.solver["num_workers"] += stats["num_workers"]
+            if stats["status"] not in SOLVED_STATUSES:
+                self.solver["status"] = stats["status"]
+            elif stats["status"] != self.solver["status"] and self.solver["status"] in SOLVED_STATUSES:
+                self.solver["status"] = "FEASIBLE"
+            self.solver["gap"] = relative_gap(self.solver["objective"], self.solver["best_bound"])
+        self.solver["subproblems"] = subproblems
+
+    def to_dict(self):
+        return {"stages": dict(self.stages), "solver": dict(self.solver)}
+
+
+def relative_gap(objective, bound):
+    return abs(objective - bound) / max(1.0, abs(objective))
+
+
+def solver_stats(solver, status):
+    objective = solver.ObjectiveValue()
+    bound = solver.BestObjectiveBound()
+    return {
+        "status": solver.StatusName(status),
+        "objective": objective,
+        "best_bound": bound,
+        "gap": relative_gap(objective, bound),
+        "branches": solver.NumBranches(),
+        "conflicts": solver.NumConflicts(),
+        "wall_time": solver.WallTime(),
+        # 0 lets CP-SAT pick, which means one worker per core
+        "num_workers": solver.parameters.num_workers or os.cpu_count() or 1,
+    }
+
+
+class MetricsRegistry:
+    """Aggregates traces and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._stage_buckets = {stage: [0] * len(BUCKETS) for stage in STAGES}
+        self._stage_sum = {stage: 0.0 for stage in STAGES}
+        self._stage_count = {stage: 0 for stage in STAGES}
+        self._solver_totals = {"branches": 0, "conflicts": 0, "wall_time": 0.0}
+        self._last_solver = {}
+
+    def observe(self, trace, status, cached=False):
+        with self._lock:
+            key = (status, "true" if cached else "false")
+            self._requests[key] = self._requests.get(key, 0) + 1
+            for stage, seconds in trace["stages"].items():
+                if stage not in self._stage_sum:
+                    continue
+                self._stage_sum[stage] += seconds
+                self._stage_count[stage] += 1
+                for i, bound in enumerate(BUCKETS):
+                    if seconds <= bound:
+                        self._stage_buckets[stage][i] += 1
+            solver = trace.get("solver")
+            if solver:
+                for key in self._solver_totals:
+                    self._solver_totals[key] += solver[key]
+                self._last_solver = solver
+
+    def render(self, gauges=None):
+        lines = [
+            "# HELP schedule_requests_total Finished optimization requests.",
+            "# TYPE schedule_requests_total counter",
+        ]
+        with self._lock:
+            for (status, cached), count in sorted(self._requests.items()):
+                lines.append(f'schedule_requests_total{{status="{status}",cached="{cached}"}} {count}')
+            lines += [
+                "# HELP schedule_stage_seconds Time spent in each optimization stage.",
+                "# TYPE schedule_stage_seconds histogram",
+            ]
+            for stage in STAGES:
+                for bound, count in zip(BUCKETS, self._stage_buckets[stage]):
+                    lines.append(f'schedule_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                count = self._stage_count[stage]
+                lines.append(f'schedule_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {count}')
+                lines.append(f'schedule_stage_seconds_sum{{stage="{stage}"}} {self._stage_sum[stage]}')
+                lines.append(f'schedule_stage_seconds_count{{stage="{stage}"}} {count}')
+            for key, total in self._solver_totals.items():
+                name = f"schedule_solver_{'wall_seconds' if key == 'wall_time' else key}_total"
+                lines += [f"# TYPE {name} counter", f"{name} {total}"]
+            for key in ("objective", "best_bound", "gap", "num_workers"):
+                if key in self._last_solver:
+                    name = f"schedule_solver_last_{key}"
+                    lines += [f"# TYPE {name} gauge", f"{name} {self._last_solver[key]}"]
+        # A gauge value is a number or a {label string: number} mapping
+        for name, value in (gauges or {}).items():
+            lines.append(f"# TYPE {name} gauge")
+            samples = value if isinstance(value, dict) else {"": value}
+            for labels, sample in samples.items():
+                lines.append(f"{name}{labels} {sample}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
@@ -1,5 +1,12 @@
 const API_BASE_URL = 'http://localhost:8000';
 
+// Gzip the request body when the browser supports CompressionStream
+const gzip = async (text) => {
+  if (typeof CompressionStream === 'undefined') return null;
+  const stream = new Blob([text]).stream().pipeThrough(new CompressionStream('gzip'));
+  return new Response(stream).blob();
+};
+
 export const optimizeSchedule = async (caregivers) => {
   if (!caregivers || !caregivers.length) {
     throw new Error('No caregivers data to optimize');
@@ -12,11 +19,18 @@ export const optimizeSchedule = async (caregivers) => {
     }))
   };
 
-  const query = encodeURIComponent(JSON.stringify(scheduleJson));
-  
-  const response = await fetch(`${API_BASE_URL}/optimize-schedule/?data=${query}`);
+  const body = JSON.stringify(scheduleJson);
+  const compressed = await gzip(body);
+  const headers = { 'Content-Type': 'application/json' };
+  if (compressed) headers['Content-Encoding'] = 'gzip';
+
+  const response = await fetch(`${API_BASE_URL}/optimize-schedule/`, {
+    method: 'POST',
+    headers,
+    body: compressed || body
+  });
   if (!response.ok) throw new Error('API error');
-  
+
   const result = await response.json();
   if (!result || !Array.isArray(result.caretakers)) {
     throw new Error('Malformed backend result');